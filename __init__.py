@@ -1,8 +1,11 @@
+import asyncio
 import aiohttp
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.components.light import LightEntity
 from datetime import timedelta
 import voluptuous as vol
@@ -16,27 +19,79 @@ currentdir = os.path.dirname(os.path.abspath(__file__))
 libs_path = os.path.join(currentdir, 'libs')
 sys.path.insert(0, libs_path)
 
+import numpy as np
 import socketio
 
+from .daylight import DEFAULT_DAYLIGHT_INTERVAL, DEFAULT_NIGHT_LEVEL, DaylightOverlay
+from .effects import EffectRenderer
+from .entity_store import EntityStore
+from .frame import DEFAULT_PALETTE_MAX_ERROR
+from .framebuffer import Framebuffer
+from .geo import GeoIndex
+from .health import TransportHealth
+from .heatmap import DEFAULT_COLORMAP, DEFAULT_HALF_LIFE, DEFAULT_HEAT_SCALE, COLORMAPS, HeatmapLayer
+from .http_pool import DEFAULT_REQUEST_TIMEOUT, PoolStats, create_session
+from .index import AddressIndex, HierarchyIndex
+from .projection import ImageProjector
+from .scheduler import DEFAULT_FRAME_RATE, FrameScheduler
+from .transition import EASING_EASE_IN_OUT, EASINGS, TransitionEngine
+from .transport import (
+    DEFAULT_ACK_TIMEOUT,
+    DEFAULT_MAX_INFLIGHT,
+    DEFAULT_OFFLINE_GRACE,
+    WS_NAMESPACE,
+    ColorCommandBatcher,
+    FrameSender,
+    WebSocketConnection,
+    async_probe_rest,
+    async_probe_websocket,
+)
+
 DOMAIN = "world_map_entity_manager"
 
+# Window (in milliseconds) over which light commands are coalesced into one
+# batch. 0 batches everything issued within the same event-loop tick.
+DEFAULT_BATCH_WINDOW = 0
+
+# State is pushed over the websocket, so polling is only a consistency check.
+CONSISTENCY_CHECK_INTERVAL = timedelta(hours=1)
+
+# How often the transport and frame counters are logged at debug level.
+STATS_LOG_INTERVAL = timedelta(minutes=5)
+
+# The last good entity list is cached on disk so lights can be created at
+# startup without waiting for the backend.
+CACHE_KEY = f"{DOMAIN}.entities"
+CACHE_VERSION = 1
+CACHE_SAVE_DELAY = 30
+
 _LOGGER = logging.getLogger(__name__)
 
+def valid_address_range(data):
+    """Reject an entity whose end_addr is before its start_addr.
+
+    Whether the entity or its parent exists is left to the backend, since
+    the local index may be stale.
+    """
+    if data["end_addr"] < data["start_addr"]:
+        raise vol.Invalid(f"end_addr {data['end_addr']} is before start_addr {data['start_addr']}")
+    return data
+
 # Define the schema for your service calls
-CREATE_ENTITY_SCHEMA = vol.Schema({
+CREATE_ENTITY_SCHEMA = vol.All(vol.Schema({
     vol.Required("name"): cv.string,
     vol.Required("start_addr"): cv.positive_int,
     vol.Required("end_addr"): cv.positive_int,
     vol.Optional("parent_id"): cv.positive_int,
-})
+}), valid_address_range)
 
-UPDATE_ENTITY_SCHEMA = vol.Schema({
+UPDATE_ENTITY_SCHEMA = vol.All(vol.Schema({
     vol.Required("id"): cv.positive_int,
     vol.Required("name"): cv.string,
     vol.Required("start_addr"): cv.positive_int,
     vol.Required("end_addr"): cv.positive_int,
     vol.Optional("parent_id"): cv.positive_int,
-})
+}), valid_address_range)
 
 DELETE_ENTITY_SCHEMA = vol.Schema({
     vol.Required("id"): cv.positive_int,
@@ -51,88 +106,433 @@ SET_COLOR_SCHEMA = vol.Schema({
     vol.Required("is_on"): cv.boolean,
 })
 
-async def async_setup_websocket(hass: HomeAssistant, host, port):
-    sio = socketio.AsyncClient(logger=_LOGGER)
+PUSH_FRAME_SCHEMA = vol.Schema({
+    vol.Optional("start_addr"): cv.positive_int,
+    vol.Optional("end_addr"): cv.positive_int,
+})
+
+GEO_COLOR_FIELDS = {
+    vol.Required("red"): cv.byte,
+    vol.Required("green"): cv.byte,
+    vol.Required("blue"): cv.byte,
+    vol.Optional("brightness", default=100): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+    vol.Optional("is_on", default=True): cv.boolean,
+}
+
+COLOR_RADIUS_SCHEMA = vol.Schema({
+    vol.Required("latitude"): cv.latitude,
+    vol.Required("longitude"): cv.longitude,
+    vol.Required("radius"): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    **GEO_COLOR_FIELDS,
+})
+
+COLOR_BBOX_SCHEMA = vol.Schema({
+    vol.Required("south"): cv.latitude,
+    vol.Required("west"): cv.longitude,
+    vol.Required("north"): cv.latitude,
+    vol.Required("east"): cv.longitude,
+    **GEO_COLOR_FIELDS,
+})
+
+COLOR_POLYGON_SCHEMA = vol.Schema({
+    vol.Required("points"): vol.All(
+        cv.ensure_list,
+        [vol.All(vol.ExactSequence([cv.latitude, cv.longitude]))],
+        vol.Length(min=3),
+    ),
+    **GEO_COLOR_FIELDS,
+})
+
+ADD_HEAT_SCHEMA = vol.Schema({
+    vol.Required("points"): vol.All(
+        cv.ensure_list,
+        [vol.All(list, vol.Length(min=2, max=3), [vol.Coerce(float)])],
+    ),
+})
+
+PROJECT_IMAGE_SCHEMA = vol.Schema({
+    vol.Exclusive("url", "source"): cv.url,
+    vol.Exclusive("path", "source"): cv.string,
+    vol.Optional("brightness", default=100): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+})
+
+# Fields an entity needs before it can be indexed and shown as a light.
+ENTITY_REQUIRED_FIELDS = {"id", "name", "start_addr", "end_addr"}
+
+def apply_entity_deltas(data, deltas):
+    """Return a copy of the entity list with the given per-entity deltas applied.
+
+    Each delta carries the entity ``id`` plus the fields that changed; its
+    ``state`` is merged into the existing state. A delta with ``deleted`` set
+    removes the entity, and a delta for an unknown id adds it if it carries
+    every field in ``ENTITY_REQUIRED_FIELDS``. Returns the entity list and the
+    number of deltas skipped because they were for an unknown id and partial.
+    """
+    entities = {entity["id"]: entity for entity in data or []}
+    skipped = 0
+    for delta in deltas:
+        entity_id = delta["id"]
+        if delta.get("deleted"):
+            entities.pop(entity_id, None)
+            continue
+        if entity_id not in entities and not ENTITY_REQUIRED_FIELDS <= delta.keys():
+            skipped += 1
+            continue
+        entity = dict(entities.get(entity_id, {}))
+        for key, value in delta.items():
+            if key == "state":
+                entity["state"] = {**entity.get("state", {}), **value}
+            else:
+                entity[key] = value
+        entities[entity_id] = entity
+    return list(entities.values()), skipped
+
+@callback
+def async_setup_websocket(hass: HomeAssistant, host, port, coordinator, session):
+    """Create the Socket.IO client and start connecting in the background."""
+    sio = socketio.AsyncClient(logger=_LOGGER, http_session=session)
+    connection = WebSocketConnection(hass, sio, f'ws://{host}:{port}')
 
-    @sio.event
+    @sio.on('connect', namespace=WS_NAMESPACE)
     async def connect():
         _LOGGER.info("Connected to WebSocket Server")
+        connection.async_set_connected()
 
-    @sio.event
+    @sio.on('disconnect', namespace=WS_NAMESPACE)
     async def disconnect():
         _LOGGER.info("Disconnected from WebSocket Server")
+        connection.async_set_disconnected()
 
-    try:
-        await sio.connect(f'ws://{host}:{port}', namespaces=['/ws-color'])
-        return sio
-    except Exception as e:
-        _LOGGER.error(f"Failed to establish WebSocket connection: {e}")
-        return None
+    @sio.on('entities', namespace=WS_NAMESPACE)
+    async def on_entities(data):
+        """Replace the coordinator data with the snapshot pushed on connect."""
+        _LOGGER.debug(f"Received snapshot of {len(data)} entities")
+        coordinator.async_set_updated_data(data)
+
+    @sio.on('heat', namespace=WS_NAMESPACE)
+    async def on_heat(data):
+        """Add a pushed batch of ``[lat, lon, weight]`` points to the heatmap."""
+        heatmap = hass.data[DOMAIN].get("heatmap")
+        if heatmap is not None:
+            try:
+                heatmap.add_rows(data)
+            except ValueError as e:
+                _LOGGER.warning(f"Ignoring pushed heat batch: {e}")
+
+    @sio.on('entity_update', namespace=WS_NAMESPACE)
+    async def on_entity_update(data):
+        """Apply one or more pushed entity deltas to the coordinator data."""
+        deltas = data if isinstance(data, list) else [data]
+        entities, skipped = apply_entity_deltas(coordinator.data, deltas)
+        coordinator.async_set_updated_data(entities)
+        if skipped:
+            # We missed the entity's creation; fetch the full list instead.
+            _LOGGER.debug(f"Got {skipped} partial deltas for unknown entities, refreshing")
+            hass.async_create_task(async_refresh_once(hass))
+
+    connection.async_start()
+    return connection
+
+async def async_refresh_once(hass: HomeAssistant):
+    """Refresh the coordinator, sharing one fetch between concurrent callers.
+
+    Callers that arrive while a refresh is running wait for that refresh
+    instead of starting another request against /entity/.
+    """
+    domain_data = hass.data[DOMAIN]
+    task = domain_data.get("refresh_task")
+    if task is None or task.done():
+        task = hass.async_create_task(domain_data["coordinator"].async_refresh())
+        domain_data["refresh_task"] = task
+    await asyncio.shield(task)
+
+@callback
+def async_propagate_color(hass: HomeAssistant, entity_id, data):
+    """Optimistically apply a color command to an entity and its descendants.
+
+    A command on a parent applies to its whole address range, children
+    included, so it is one slice assignment on the framebuffer. Light state
+    is derived from the framebuffer, so every light whose range overlaps the
+    command, ancestors included, gets its state written.
+    """
+    address_index = hass.data[DOMAIN]["address_index"]
+    record = address_index.get(entity_id)
+    if record is None:
+        return
+    hass.data[DOMAIN]["transitions"].cancel(record[0], record[1])
+    hass.data[DOMAIN]["effects"].stop(record[0], record[1])
+    framebuffer = hass.data[DOMAIN]["framebuffer"]
+    framebuffer.apply_color_data(record[0], record[1], data)
+    if framebuffer.has_overlay:
+        # The backend shows the raw command colors; follow up with the frame
+        # the overlays actually render for them.
+        hass.async_create_task(hass.data[DOMAIN]["frame_sender"].async_send_changes(framebuffer))
+    entities = hass.data[DOMAIN]["entities"]
+    for overlapping_id in address_index.overlapping(record[0], record[1]):
+        entity = entities.get(overlapping_id)
+        if entity is not None:
+            entity.async_write_ha_state()
+
+async def async_color_addresses(hass: HomeAssistant, addrs, rgb, brightness, is_on=True):
+    """Color the LEDs at sorted ``addrs`` and send them as one frame.
+
+    ``rgb`` is one color or one row per address; ``brightness`` uses the
+    backend's 0-100 scale. Lights whose range overlaps the colored LEDs get
+    their state written.
+    """
+    if not len(addrs):
+        return
+    hass.data[DOMAIN]["transitions"].cancel_indices(addrs)
+    hass.data[DOMAIN]["effects"].stop_indices(addrs)
+    framebuffer = hass.data[DOMAIN]["framebuffer"]
+    framebuffer.set_indices(addrs, rgb, int(brightness / 100 * 255), is_on)
+    await hass.data[DOMAIN]["frame_sender"].async_send_changes(framebuffer)
+    entities = hass.data[DOMAIN]["entities"]
+    for entity_id in hass.data[DOMAIN]["address_index"].overlapping(int(addrs[0]), int(addrs[-1])):
+        entity = entities.get(entity_id)
+        if entity is not None:
+            entity.async_write_ha_state()
+
+async def async_enable_heatmap(hass: HomeAssistant, heatmap_layer):
+    """Build the heatmap's nearest-LED table in the executor, then start the layer.
+
+    Setup does not wait for this; points sent before it finishes are dropped.
+    """
+    await hass.async_add_executor_job(heatmap_layer.build_lookup)
+    heatmap_layer.enable()
+    _LOGGER.debug("Heatmap lookup table ready")
+
+@callback
+def async_log_stats(hass: HomeAssistant):
+    """Log the batcher, frame scheduler, frame encoder and HTTP pool counters at debug level."""
+    if not _LOGGER.isEnabledFor(logging.DEBUG):
+        return
+    _LOGGER.debug(f"Color batcher stats: {hass.data[DOMAIN]['batcher'].stats}")
+    _LOGGER.debug(f"Frame scheduler stats: {hass.data[DOMAIN]['scheduler'].stats}")
+    _LOGGER.debug(f"Frame encoder stats: {hass.data[DOMAIN]['frame_sender'].encoder.stats}")
+    _LOGGER.debug(f"HTTP pool stats: {hass.data[DOMAIN]['pool_stats'].stats}")
 
 async def async_setup(hass: HomeAssistant, config: dict) -> bool:
     """Set up the component."""
 
-    # Create an aiohttp session for HTTP requests
-    session = aiohttp.ClientSession()
-
     conf = config.get(DOMAIN)
 
     host = conf.get("host")
     port = conf.get("port")
+    batch_window = conf.get("batch_window", DEFAULT_BATCH_WINDOW)
+    max_inflight = conf.get("max_inflight", DEFAULT_MAX_INFLIGHT)
+    ack_timeout = conf.get("ack_timeout", DEFAULT_ACK_TIMEOUT)
+    offline_grace = conf.get("offline_grace", DEFAULT_OFFLINE_GRACE)
+    num_leds = conf.get("num_leds", 0)
+    frame_rate = conf.get("frame_rate", DEFAULT_FRAME_RATE)
+    transition_easing = conf.get("transition_easing", EASING_EASE_IN_OUT)
+    request_timeout = conf.get("request_timeout", DEFAULT_REQUEST_TIMEOUT)
+    palette_frames = conf.get("palette_frames", False)
+    palette_max_error = conf.get("palette_max_error", DEFAULT_PALETTE_MAX_ERROR)
+    calibration_file = conf.get("calibration_file")
+    daylight = conf.get("daylight", False)
+    daylight_interval = conf.get("daylight_interval", DEFAULT_DAYLIGHT_INTERVAL)
+    night_level = conf.get("night_level", DEFAULT_NIGHT_LEVEL)
+    heatmap = conf.get("heatmap", False)
+    heat_half_life = conf.get("heat_half_life", DEFAULT_HALF_LIFE)
+    heat_scale = conf.get("heat_scale", DEFAULT_HEAT_SCALE)
+    heat_colormap = conf.get("heat_colormap", DEFAULT_COLORMAP)
+
+    if transition_easing not in EASINGS:
+        _LOGGER.error(f"Unknown transition_easing {transition_easing}, using {EASING_EASE_IN_OUT}")
+        transition_easing = EASING_EASE_IN_OUT
+    if not frame_rate > 0:
+        _LOGGER.error(f"Invalid frame_rate {frame_rate}, using {DEFAULT_FRAME_RATE}")
+        frame_rate = DEFAULT_FRAME_RATE
+
+    # One pooled session for every HTTP request, the Socket.IO client included
+    pool_stats = PoolStats()
+    session = create_session(pool_stats, request_timeout)
    
     coordinator = DataUpdateCoordinator(
         hass,
         logger=_LOGGER,
         name="world_map_entity_manager",
         update_method=lambda: async_update_data(hass),
-        update_interval=timedelta(minutes=5),
+        update_interval=CONSISTENCY_CHECK_INTERVAL,
+        # A 304 returns the current data, which must not wake the listeners.
+        always_update=False,
     )
 
     # Setup WebSocket connection
-    websocket_client = await async_setup_websocket(hass, host, port)
+    connection = async_setup_websocket(hass, host, port, coordinator, session)
+
+    api_url = f"http://{host}:{port}"
+    entity_store = EntityStore()
+    address_index = AddressIndex()
+    hierarchy = HierarchyIndex()
+    framebuffer = Framebuffer(num_leds)
+    cache = Store(hass, CACHE_VERSION, CACHE_KEY)
+
+    @callback
+    def async_update_models():
+        data = coordinator.data or []
+        added, changed, removed = entity_store.update(data)
+        if not (added or changed or removed):
+            return
+        address_index.update(data)
+        hierarchy.update(data)
+        # A parent's state covers its children's LEDs, so reload whole
+        # subtrees of the changed entities, parents first.
+        reloaded = hierarchy.subtrees(added | changed)
+        framebuffer.load_entities(entity_store, reloaded)
+        # Every entity over a reloaded range shows new LED state, not just the
+        # changed ones (their ancestors' derived state moves too).
+        affected = set(changed)
+        for entity_id in reloaded:
+            start, end, _ = address_index.get(entity_id)
+            affected.update(address_index.overlapping(start, end))
+        entity_store.async_notify(affected)
+        entity_store.async_notify_membership(added, removed)
+        cache.async_delay_save(lambda: list(entity_store.values()), CACHE_SAVE_DELAY)
+
+    coordinator.async_add_listener(async_update_models)
+
+    ws_health = TransportHealth(
+        hass, "WebSocket", lambda: async_probe_websocket(connection, ack_timeout), ack_timeout / 2)
+    rest_health = TransportHealth(hass, "REST", lambda: async_probe_rest(session, api_url))
+
+    batcher = ColorCommandBatcher(
+        hass, api_url, session, connection, ws_health, rest_health,
+        batch_window / 1000, max_inflight, ack_timeout, offline_grace)
+    frame_sender = FrameSender(
+        hass, api_url, session, connection, ws_health, rest_health, palette_frames, palette_max_error)
+    scheduler = FrameScheduler(hass, framebuffer, frame_sender, frame_rate)
+    transitions = TransitionEngine(framebuffer, scheduler, transition_easing)
+    effects = EffectRenderer(framebuffer, scheduler)
 
     hass.data[DOMAIN] = {
         "coordinator": coordinator,
         "session": session,
-        "API_URL": f"http://{host}:{port}",
-        "websocket": websocket_client
+        "pool_stats": pool_stats,
+        "API_URL": api_url,
+        "websocket": connection,
+        "batcher": batcher,
+        "frame_sender": frame_sender,
+        "scheduler": scheduler,
+        "transitions": transitions,
+        "effects": effects,
+        "entity_store": entity_store,
+        "address_index": address_index,
+        "hierarchy": hierarchy,
+        "framebuffer": framebuffer,
+        "entities": {},
+        "entity_validators": {},
     }
+    hass.data[DOMAIN]["stats_unsub"] = async_track_time_interval(
+        hass, callback(lambda now: async_log_stats(hass)), STATS_LOG_INTERVAL)
 
-    await coordinator.async_refresh()
+    # Start from the cached entity list, if any, and reconcile with the
+    # backend in the background. Lights for entities that only show up once
+    # the backend answers are added by the platform as they arrive.
+    cached = await cache.async_load()
+    if cached:
+        _LOGGER.debug(f"Loaded {len(cached)} entities from cache")
+        coordinator.async_set_updated_data(cached)
+    hass.async_create_task(async_refresh_once(hass))
 
-    if coordinator.data is not None:
-        hass.async_create_task(
-            hass.helpers.discovery.async_load_platform('light', DOMAIN, {}, config)
-        )
+    hass.async_create_task(
+        hass.helpers.discovery.async_load_platform('light', DOMAIN, {}, config)
+    )
 
     # Register your services
     hass.services.async_register(DOMAIN, "create_entity", lambda call: handle_create_entity(call, session, hass), schema=CREATE_ENTITY_SCHEMA)
     hass.services.async_register(DOMAIN, "update_entity", lambda call: handle_update_entity(call, session, hass), schema=UPDATE_ENTITY_SCHEMA)
     hass.services.async_register(DOMAIN, "delete_entity", lambda call: handle_delete_entity(call, session, hass), schema=DELETE_ENTITY_SCHEMA)
-    hass.services.async_register(DOMAIN, "set_color", lambda call: handle_set_color(call, hass), schema=SET_COLOR_SCHEMA)
+    hass.services.async_register(DOMAIN, "set_color", lambda call: handle_set_color(call, session, hass), schema=SET_COLOR_SCHEMA)
+    hass.services.async_register(DOMAIN, "push_frame", lambda call: handle_push_frame(call, hass), schema=PUSH_FRAME_SCHEMA)
+    hass.services.async_register(DOMAIN, "snapshot", lambda call: handle_snapshot(call, hass))
+    hass.services.async_register(DOMAIN, "restore", lambda call: handle_restore(call, hass))
     # Register other services similarly
 
+    if calibration_file:
+        try:
+            geo_index = await hass.async_add_executor_job(GeoIndex.load, hass.config.path(calibration_file))
+        except (OSError, ValueError) as e:
+            _LOGGER.error(f"Failed to load LED calibration from {calibration_file}: {e}")
+        else:
+            _LOGGER.debug(f"Loaded positions of {len(geo_index)} LEDs")
+            hass.data[DOMAIN]["geo_index"] = geo_index
+            hass.services.async_register(DOMAIN, "color_radius", lambda call: handle_color_radius(call, hass), schema=COLOR_RADIUS_SCHEMA)
+            hass.services.async_register(DOMAIN, "color_bbox", lambda call: handle_color_bbox(call, hass), schema=COLOR_BBOX_SCHEMA)
+            hass.services.async_register(DOMAIN, "color_polygon", lambda call: handle_color_polygon(call, hass), schema=COLOR_POLYGON_SCHEMA)
+            hass.data[DOMAIN]["projector"] = ImageProjector(geo_index)
+            hass.services.async_register(DOMAIN, "project_image", lambda call: handle_project_image(call, hass), schema=PROJECT_IMAGE_SCHEMA)
+
+            if daylight:
+                overlay = DaylightOverlay(framebuffer, geo_index, frame_sender, night_level)
+                hass.data[DOMAIN]["daylight"] = overlay
+                hass.async_create_task(overlay.async_update())
+                hass.data[DOMAIN]["daylight_unsub"] = async_track_time_interval(
+                    hass, overlay.async_update, timedelta(seconds=daylight_interval))
+
+            if heatmap:
+                if heat_colormap not in COLORMAPS:
+                    _LOGGER.error(f"Unknown heat_colormap {heat_colormap}, using {DEFAULT_COLORMAP}")
+                    heat_colormap = DEFAULT_COLORMAP
+                heatmap_layer = HeatmapLayer(
+                    framebuffer, scheduler, geo_index, heat_half_life, heat_scale, heat_colormap)
+                hass.data[DOMAIN]["heatmap"] = heatmap_layer
+                hass.async_create_task(async_enable_heatmap(hass, heatmap_layer))
+                hass.services.async_register(DOMAIN, "add_heat", lambda call: handle_add_heat(call, hass), schema=ADD_HEAT_SCHEMA)
+                hass.services.async_register(DOMAIN, "clear_heat", lambda call: handle_clear_heat(call, hass))
+    elif daylight or heatmap:
+        _LOGGER.error("The daylight overlay and heatmap need a calibration_file with the LED positions")
+
     async def async_close_websocket(event):
         """Close WebSocket connection on shutdown."""
-        websocket_client = hass.data[DOMAIN]["websocket"]
-        if websocket_client:
-            await websocket_client.disconnect()
+        await hass.data[DOMAIN]["scheduler"].async_stop()
+        ws_health.cancel()
+        rest_health.cancel()
+        hass.data[DOMAIN]["stats_unsub"]()
+        if "daylight_unsub" in hass.data[DOMAIN]:
+            hass.data[DOMAIN]["daylight_unsub"]()
+        await hass.data[DOMAIN]["websocket"].async_stop()
+        await session.close()
 
     hass.bus.async_listen_once("homeassistant_stop", async_close_websocket)
 
     return True
 
 async def async_update_data(hass: HomeAssistant):
-    """Fetch data from API."""
+    """Fetch data from API.
+
+    The request carries the validators of the last response, so when the
+    entity list has not changed the backend answers 304 and the current data
+    is kept without downloading or parsing anything.
+    """
     api_url = hass.data[DOMAIN]["API_URL"]
-    session = hass.data[DOMAIN]["session"] 
+    session = hass.data[DOMAIN]["session"]
+    coordinator = hass.data[DOMAIN]["coordinator"]
+    validators = hass.data[DOMAIN]["entity_validators"]
 
-    async with session.get(f"{api_url}/entity/") as response:
+    headers = {}
+    if coordinator.data is not None:
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    async with session.get(f"{api_url}/entity/", headers=headers) as response:
+        if response.status == 304:
+            _LOGGER.debug("Entity list not modified")
+            return coordinator.data
         if response.status != 200:
             _LOGGER.error(f"Failed to fetch data: {response.status}")
             raise UpdateFailed(f"Error fetching data: {response.status}")
         data = await response.json()
-        _LOGGER.debug(f"Fetched data: {data}")
+        validators.clear()
+        if "ETag" in response.headers:
+            validators["etag"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            validators["last_modified"] = response.headers["Last-Modified"]
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"Fetched data: {data}")
         return data
 
 async def handle_create_entity(call: ServiceCall, session: aiohttp.ClientSession, hass: HomeAssistant):
@@ -146,6 +546,7 @@ async def handle_create_entity(call: ServiceCall, session: aiohttp.ClientSession
                 # Handle successful response
                 response_data = await response.json()
                 # Log or perform actions based on the response data
+                await async_refresh_once(hass)
             else:
                 # Log or handle the error
                 error_message = await response.text()
@@ -157,12 +558,14 @@ async def handle_update_entity(call: ServiceCall, session: aiohttp.ClientSession
     """Handle the service call to update an entity."""
     entity_data = call.data
     api_url = hass.data[DOMAIN]["API_URL"]  # Access API_URL from hass.data
+
     try:
         async with session.put(f"{api_url}/entity/", json=entity_data) as response:
             if response.status == 200:
                 # Handle successful response
                 response_data = await response.json()
                 # Log or perform actions based on the response data
+                await async_refresh_once(hass)
             else:
                 # Log or handle the error
                 error_message = await response.text()
@@ -179,6 +582,7 @@ async def handle_delete_entity(call: ServiceCall, session: aiohttp.ClientSession
             if response.status == 200:
                 # Handle successful response
                 _LOGGER.info(f"Entity {entity_id} deleted successfully")
+                await async_refresh_once(hass)
             else:
                 # Log or handle the error
                 error_message = await response.text()
@@ -195,9 +599,123 @@ async def handle_set_color(call: ServiceCall, session: aiohttp.ClientSession, ha
             if response.status == 200:
                 # Handle successful response
                 _LOGGER.info(f"Color set successfully for entity {color_data.get('entity')}")
+                async_propagate_color(hass, color_data["entity"], color_data)
             else:
                 # Log or handle the error
                 error_message = await response.text()
                 _LOGGER.error(f"Failed to set color: {error_message}")
     except aiohttp.ClientError as e:
-        _LOGGER.error(f"Error communicating with API: {e}")
\ No newline at end of file
+        _LOGGER.error(f"Error communicating with API: {e}")
+
+async def handle_push_frame(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to push the local framebuffer as a binary frame.
+
+    Without a window only what changed since the last frame is sent.
+    """
+    framebuffer = hass.data[DOMAIN]["framebuffer"]
+    frame_sender = hass.data[DOMAIN]["frame_sender"]
+    if "start_addr" not in call.data and "end_addr" not in call.data:
+        if await frame_sender.async_send_changes(framebuffer):
+            _LOGGER.info(f"Pushed frame changes, encoder stats: {frame_sender.encoder.stats}")
+        return
+
+    start = call.data.get("start_addr", 0)
+    end = call.data.get("end_addr", len(framebuffer) - 1)
+    if end < start or end >= len(framebuffer):
+        _LOGGER.error(f"Invalid frame window [{start}, {end}] for {len(framebuffer)} LEDs")
+        return
+    if await frame_sender.async_send_window(framebuffer, start, end):
+        _LOGGER.info(f"Pushed frame for LEDs {start}-{end}")
+
+async def handle_snapshot(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to snapshot the whole LED chain for a later restore."""
+    hass.data[DOMAIN]["snapshot"] = hass.data[DOMAIN]["framebuffer"].snapshot()
+
+async def handle_restore(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to restore the last snapshot and send it as one frame."""
+    snapshot = hass.data[DOMAIN].get("snapshot")
+    if snapshot is None:
+        _LOGGER.error("No snapshot to restore")
+        return
+    framebuffer = hass.data[DOMAIN]["framebuffer"]
+    addrs = np.arange(len(framebuffer))
+    hass.data[DOMAIN]["transitions"].cancel_indices(addrs)
+    hass.data[DOMAIN]["effects"].stop_indices(addrs)
+    framebuffer.restore(snapshot)
+    await hass.data[DOMAIN]["frame_sender"].async_send_changes(framebuffer)
+    for entity in hass.data[DOMAIN]["entities"].values():
+        entity.async_write_ha_state()
+
+async def handle_color_radius(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to color every LED within a radius of a point."""
+    geo_index = hass.data[DOMAIN]["geo_index"]
+    addrs = geo_index.radius(call.data["latitude"], call.data["longitude"], call.data["radius"])
+    await async_color_addresses(
+        hass, addrs, (call.data["red"], call.data["green"], call.data["blue"]),
+        call.data["brightness"], call.data["is_on"])
+
+async def handle_color_bbox(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to color every LED inside a bounding box."""
+    geo_index = hass.data[DOMAIN]["geo_index"]
+    addrs = geo_index.bbox(call.data["south"], call.data["west"], call.data["north"], call.data["east"])
+    await async_color_addresses(
+        hass, addrs, (call.data["red"], call.data["green"], call.data["blue"]),
+        call.data["brightness"], call.data["is_on"])
+
+async def handle_color_polygon(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to color every LED inside a polygon."""
+    geo_index = hass.data[DOMAIN]["geo_index"]
+    addrs = geo_index.polygon(call.data["points"])
+    await async_color_addresses(
+        hass, addrs, (call.data["red"], call.data["green"], call.data["blue"]),
+        call.data["brightness"], call.data["is_on"])
+
+async def handle_add_heat(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to add a batch of points to the heatmap."""
+    hass.data[DOMAIN]["heatmap"].add_rows(call.data["points"])
+
+async def handle_clear_heat(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to clear the heatmap."""
+    hass.data[DOMAIN]["heatmap"].clear()
+
+def _read_file(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+async def handle_project_image(call: ServiceCall, hass: HomeAssistant):
+    """Handle the service call to paint an equirectangular image onto the map.
+
+    The image is fetched or read, then decoded and sampled in the executor.
+    """
+    if "url" in call.data:
+        session = hass.data[DOMAIN]["session"]
+        try:
+            async with session.get(call.data["url"]) as response:
+                if response.status != 200:
+                    _LOGGER.error(f"Failed to fetch image: {response.status}")
+                    return
+                data = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _LOGGER.error(f"Error fetching image: {e}")
+            return
+    elif "path" in call.data:
+        path = hass.config.path(call.data["path"])
+        if not hass.config.is_allowed_path(path):
+            _LOGGER.error(f"Image path {path} is not in allowlist_external_dirs")
+            return
+        try:
+            data = await hass.async_add_executor_job(_read_file, path)
+        except OSError as e:
+            _LOGGER.error(f"Error reading image: {e}")
+            return
+    else:
+        _LOGGER.error("project_image needs a url or a path")
+        return
+
+    projector = hass.data[DOMAIN]["projector"]
+    try:
+        addrs, rgb = await hass.async_add_executor_job(projector.project, data)
+    except (OSError, ValueError) as e:
+        _LOGGER.error(f"Error decoding image: {e}")
+        return
+    await async_color_addresses(hass, addrs, rgb, call.data["brightness"])
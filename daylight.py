@@ -0,0 +1,76 @@
+import logging
+import math
+import time
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_DAYLIGHT_INTERVAL = 60  # seconds
+DEFAULT_NIGHT_LEVEL = 20  # percent of full brightness
+
+# Sun elevations (degrees) bounding the civil, nautical and astronomical
+# twilight bands, and how far each band dims towards the night level.
+TWILIGHT_ELEVATIONS = [-18, -12, -6, 0]
+TWILIGHT_FRACTIONS = [0.0, 0.25, 0.6, 1.0]
+
+
+def subsolar_point(timestamp):
+    """Return the ``(latitude, longitude)`` in degrees where the sun is overhead.
+
+    Uses the low-precision solar coordinates from the Astronomical Almanac,
+    good to about 0.01 degrees, which is far below the LED pitch.
+    """
+    days = timestamp / 86400 + 2440587.5 - 2451545.0
+    mean_longitude = (280.460 + 0.9856474 * days) % 360
+    anomaly = math.radians((357.528 + 0.9856003 * days) % 360)
+    ecliptic_longitude = math.radians(
+        mean_longitude + 1.915 * math.sin(anomaly) + 0.020 * math.sin(2 * anomaly))
+    obliquity = math.radians(23.439 - 0.0000004 * days)
+    declination = math.asin(math.sin(obliquity) * math.sin(ecliptic_longitude))
+    right_ascension = math.atan2(
+        math.cos(obliquity) * math.sin(ecliptic_longitude), math.cos(ecliptic_longitude))
+    sidereal = (280.46061837 + 360.98564736629 * days) % 360
+    longitude = (math.degrees(right_ascension) - sidereal + 180) % 360 - 180
+    return math.degrees(declination), longitude
+
+
+def sun_elevation(lat, lon, timestamp):
+    """Return the sun elevation in degrees at each point of the given arrays."""
+    sun_lat, sun_lon = map(math.radians, subsolar_point(timestamp))
+    lat = np.radians(lat)
+    sin_elevation = (np.sin(lat) * math.sin(sun_lat)
+                     + np.cos(lat) * math.cos(sun_lat) * np.cos(np.radians(lon) - sun_lon))
+    return np.degrees(np.arcsin(np.clip(sin_elevation, -1, 1)))
+
+
+class DaylightOverlay:
+    """Dim the night side of the map, with soft twilight bands.
+
+    For every calibrated LED the sun elevation is computed in one vectorized
+    pass and mapped to a shade level that the framebuffer multiplies into the
+    rendered frame. The colors and brightness set on the lights are left
+    untouched, and only LEDs whose shade level changed are marked dirty, so
+    each update sends just the band that moved.
+    """
+
+    def __init__(self, framebuffer, geo_index, frame_sender, night_level=DEFAULT_NIGHT_LEVEL):
+        """Initialize the overlay; ``night_level`` is a percentage of full brightness."""
+        self.framebuffer = framebuffer
+        self.geo_index = geo_index
+        self.frame_sender = frame_sender
+        night = night_level / 100
+        self._levels = [night + (1 - night) * fraction for fraction in TWILIGHT_FRACTIONS]
+
+    def shade(self, timestamp):
+        """Return the 0-255 shade of every calibrated LED at ``timestamp``."""
+        elevation = sun_elevation(self.geo_index.lat, self.geo_index.lon, timestamp)
+        level = np.interp(elevation, TWILIGHT_ELEVATIONS, self._levels)
+        return np.rint(level * 255).astype(np.uint8)
+
+    async def async_update(self, now=None):
+        """Recompute the overlay and send the LEDs whose shade changed."""
+        changed = self.framebuffer.set_shade(self.geo_index.addrs, self.shade(time.time()))
+        if changed:
+            _LOGGER.debug(f"Daylight overlay changed the shade of {changed} LEDs")
+            await self.frame_sender.async_send_changes(self.framebuffer)
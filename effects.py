@@ -0,0 +1,146 @@
+import numpy as np
+
+EFFECT_RAINBOW = "rainbow"
+EFFECT_PULSE = "pulse"
+EFFECT_CHASE = "chase"
+EFFECT_GRADIENT = "gradient"
+
+# Index 0 means "no effect".
+EFFECTS = [None, EFFECT_RAINBOW, EFFECT_PULSE, EFFECT_CHASE, EFFECT_GRADIENT]
+EFFECT_LIST = EFFECTS[1:]
+
+RAINBOW_CYCLE = 5.0  # seconds per full hue rotation
+PULSE_PERIOD = 2.0  # seconds per pulse
+CHASE_SPEED = 20.0  # LEDs per second
+CHASE_WIDTH = 5  # lit LEDs in the chase window
+GRADIENT_CYCLE = 10.0  # seconds for the gradient to scroll across its range
+
+
+def hsv_to_rgb(hue, saturation=1.0, value=1.0):
+    """Vectorized HSV to RGB; all inputs in [0, 1], returns float ``(n, 3)`` in [0, 1]."""
+    hue = np.asarray(hue, dtype=np.float32) % 1.0
+    sector = np.floor(hue * 6).astype(np.int8) % 6
+    f = hue * 6 - np.floor(hue * 6)
+    p = value * (1 - saturation)
+    q = value * (1 - saturation * f)
+    t = value * (1 - saturation * (1 - f))
+    v = np.broadcast_to(value, hue.shape)
+    p = np.broadcast_to(p, hue.shape)
+    channels = [
+        np.choose(sector, [v, q, p, p, t, v]),
+        np.choose(sector, [t, v, v, q, p, p]),
+        np.choose(sector, [p, p, t, v, v, q]),
+    ]
+    return np.stack(channels, axis=-1)
+
+
+def rgb_to_hue(rgb):
+    """Return the hue in [0, 1] of each float RGB row in [0, 1]."""
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    high = rgb.max(axis=-1)
+    delta = high - rgb.min(axis=-1)
+    safe = np.where(delta == 0, 1, delta)
+    hue = np.where(
+        high == r, ((g - b) / safe) % 6,
+        np.where(high == g, (b - r) / safe + 2, (r - g) / safe + 4),
+    )
+    return np.where(delta == 0, 0, hue / 6)
+
+
+class EffectRenderer:
+    """Render HA light effects for whole address ranges at once.
+
+    Like the transition engine, the renderer keeps per-LED arrays (effect,
+    start time, range origin and length, base color) so every running effect
+    of a kind is computed in one vectorized pass per frame, regardless of how
+    many entities run it.
+    """
+
+    def __init__(self, framebuffer, scheduler):
+        """Initialize the renderer and register it with the frame scheduler."""
+        self.framebuffer = framebuffer
+        self.scheduler = scheduler
+        self._effect = np.zeros(0, dtype=np.int8)
+        self._t0 = np.zeros(0, dtype=np.float64)
+        self._origin = np.zeros(0, dtype=np.int64)
+        self._length = np.zeros(0, dtype=np.int64)
+        self._base = np.zeros((0, 3), dtype=np.float32)
+        self._alloc(len(framebuffer))
+        scheduler.add_layer(self)
+
+    def _alloc(self, size):
+        extra = size - len(self._effect)
+        if extra <= 0:
+            return
+
+        def grow(array):
+            return np.concatenate([array, np.zeros((extra,) + array.shape[1:], dtype=array.dtype)])
+
+        self._effect = grow(self._effect)
+        self._t0 = grow(self._t0)
+        self._origin = grow(self._origin)
+        self._length = grow(self._length)
+        self._base = grow(self._base)
+
+    @property
+    def active(self):
+        """Return True while any LED runs an effect."""
+        return bool(self._effect.any())
+
+    def effect_at(self, addr):
+        """Return the name of the effect running on LED ``addr``, or None."""
+        if addr >= len(self._effect):
+            return None
+        return EFFECTS[self._effect[addr]]
+
+    def start(self, now, start, end, effect, rgb=None):
+        """Run ``effect`` on LEDs ``start..end``, based on color ``rgb``."""
+        framebuffer = self.framebuffer
+        framebuffer.resize(end + 1)
+        self._alloc(len(framebuffer))
+        window = slice(start, end + 1)
+        if rgb is None:
+            rgb = framebuffer.colors[start]
+        self._effect[window] = EFFECTS.index(effect)
+        self._t0[window] = now
+        self._origin[window] = start
+        self._length[window] = end + 1 - start
+        self._base[window] = np.asarray(rgb, dtype=np.float32) / 255
+        framebuffer.on[window] = True
+        brightness = framebuffer.brightness[window]
+        brightness[brightness == 0] = 255
+        self.scheduler.wake()
+
+    def stop(self, start, end):
+        """Stop any effect on LEDs ``start..end``, leaving the last frame shown."""
+        self._effect[start:end + 1] = 0
+
+    def stop_indices(self, indices):
+        """Stop any effect on the LEDs at ``indices``."""
+        self._effect[indices[indices < len(self._effect)]] = 0
+
+    def step(self, now):
+        """Render one frame of every running effect at time ``now``."""
+        framebuffer = self.framebuffer
+        for code in range(1, len(EFFECTS)):
+            indices = np.flatnonzero(self._effect == code)
+            if not len(indices):
+                continue
+            elapsed = now - self._t0[indices]
+            position = (indices - self._origin[indices]) / self._length[indices]
+            base = self._base[indices]
+            effect = EFFECTS[code]
+            if effect == EFFECT_RAINBOW:
+                rgb = hsv_to_rgb(position + elapsed / RAINBOW_CYCLE)
+            elif effect == EFFECT_PULSE:
+                level = 0.5 + 0.5 * np.cos(2 * np.pi * elapsed / PULSE_PERIOD)
+                rgb = base * level[:, None]
+            elif effect == EFFECT_CHASE:
+                head = (elapsed * CHASE_SPEED) % self._length[indices]
+                offset = (indices - self._origin[indices] - head) % self._length[indices]
+                rgb = base * (offset < CHASE_WIDTH)[:, None]
+            else:
+                hue = rgb_to_hue(base) + np.abs(((position - elapsed / GRADIENT_CYCLE) % 1) - 0.5) * 2 / 3
+                rgb = hsv_to_rgb(hue, value=base.max(axis=1))
+            framebuffer.colors[indices] = np.rint(rgb * 255).astype(np.uint8)
+            framebuffer.mark_dirty_indices(indices)
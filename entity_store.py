@@ -0,0 +1,92 @@
+from homeassistant.core import callback
+
+
+class EntityStore:
+    """Id-indexed store of the backend's entity dicts.
+
+    Every ``/entity/`` payload (or pushed snapshot) is diffed against the
+    stored entities; only entities whose fields actually changed have their
+    listeners called, so unchanged lights are never asked to write state.
+    """
+
+    def __init__(self):
+        """Initialize an empty store."""
+        self._entities = {}
+        self._listeners = {}
+        self._membership_listeners = []
+
+    def __contains__(self, entity_id):
+        return entity_id in self._entities
+
+    def __len__(self):
+        return len(self._entities)
+
+    def get(self, entity_id):
+        """Return the latest dict for an entity, or None."""
+        return self._entities.get(entity_id)
+
+    def values(self):
+        """Return all stored entity dicts."""
+        return self._entities.values()
+
+    def update(self, entities):
+        """Replace the stored entities with a new payload.
+
+        Returns the sets of ``(added, changed, removed)`` ids. Listeners are
+        not called here; call ``async_notify`` once dependent models have
+        been updated.
+        """
+        added = set()
+        changed = set()
+        incoming = {}
+        for entity in entities:
+            entity_id = entity["id"]
+            incoming[entity_id] = entity
+            current = self._entities.get(entity_id)
+            if current is None:
+                added.add(entity_id)
+            elif current != entity:
+                changed.add(entity_id)
+        removed = self._entities.keys() - incoming.keys()
+        self._entities = incoming
+        return added, changed, removed
+
+    @callback
+    def async_add_listener(self, entity_id, update_callback):
+        """Call ``update_callback`` whenever the given entity changes.
+
+        Returns a function that removes the listener.
+        """
+        listeners = self._listeners.setdefault(entity_id, [])
+        listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            listeners.remove(update_callback)
+            if not listeners:
+                self._listeners.pop(entity_id, None)
+
+        return remove_listener
+
+    @callback
+    def async_add_membership_listener(self, membership_callback):
+        """Call ``membership_callback(added, removed)`` when entities come or go.
+
+        Returns a function that removes the listener.
+        """
+        self._membership_listeners.append(membership_callback)
+        return lambda: self._membership_listeners.remove(membership_callback)
+
+    @callback
+    def async_notify_membership(self, added, removed):
+        """Tell membership listeners which entities were added and removed."""
+        if added or removed:
+            for membership_callback in list(self._membership_listeners):
+                membership_callback(added, removed)
+
+    @callback
+    def async_notify(self, entity_ids):
+        """Call the listeners of the given entities."""
+        for entity_id in entity_ids:
+            for update_callback in list(self._listeners.get(entity_id, ())):
+                update_callback()
@@ -0,0 +1,198 @@
+import struct
+
+import numpy as np
+
+# Each delta record is a little-endian (offset: u32, length: u16) header
+# followed by ``length`` RGB triples.
+RECORD_HEADER = struct.Struct('<IH')
+MAX_RECORD_LEDS = 0xFFFF
+
+# Two spans separated by a gap this small (in LEDs) are cheaper to send as
+# one record than to pay a second record header.
+MERGE_GAP = RECORD_HEADER.size // 3
+
+# A palette frame is a little-endian u16 palette length, that many RGB
+# triples, then one palette index byte per LED. A length of 0 means the
+# palette of the previous palette frame is reused.
+PALETTE_HEADER = struct.Struct('<H')
+MAX_PALETTE_COLORS = 256
+# Largest per-channel error a quantized palette may introduce before the
+# frame is sent as RGB instead.
+DEFAULT_PALETTE_MAX_ERROR = 8
+# Colors are grouped into bins of 2**PALETTE_BIN_SHIFT levels per channel
+# when a frame has more distinct colors than fit in a palette.
+PALETTE_BIN_SHIFT = 3
+NEAREST_CHUNK = 4096
+
+ENCODING_RGB = "rgb"
+ENCODING_DELTA = "delta"
+ENCODING_PALETTE = "palette"
+
+
+def merge_spans(spans, gap=0):
+    """Merge inclusive ``(start, end)`` spans that overlap or are ``gap`` LEDs apart."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1 + gap:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def color_keys(colors):
+    """Pack ``(n, 3)`` uint8 colors into one uint32 per row."""
+    colors = colors.astype(np.uint32)
+    return (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+
+
+def quantize(colors, max_colors=MAX_PALETTE_COLORS):
+    """Build a palette of at most ``max_colors`` for distinct ``(u, 3)`` uint8 colors.
+
+    Returns ``(palette, index, error)``: the palette, the palette index of
+    each input color, and the largest per-channel error. Inputs that already
+    fit are used as-is; otherwise colors are grouped into coarse bins and the
+    most populated bins' mean colors form the palette.
+    """
+    if len(colors) <= max_colors:
+        return colors, np.arange(len(colors)), 0
+    coarse = colors >> PALETTE_BIN_SHIFT
+    bins, members = np.unique(color_keys(coarse), return_inverse=True)
+    sizes = np.bincount(members)
+    means = np.stack(
+        [np.bincount(members, weights=colors[:, c]) / sizes for c in range(3)], axis=1)
+    top = np.argsort(-sizes, kind="stable")[:max_colors]
+    palette = np.rint(means[top]).astype(np.uint8)
+
+    # Map every color to its nearest palette entry, in chunks to bound memory.
+    entries = palette.astype(np.int32)
+    index = np.empty(len(colors), dtype=np.int64)
+    for start in range(0, len(colors), NEAREST_CHUNK):
+        block = colors[start:start + NEAREST_CHUNK].astype(np.int32)
+        distance = ((block[:, None, :] - entries[None, :, :]) ** 2).sum(axis=2)
+        index[start:start + NEAREST_CHUNK] = distance.argmin(axis=1)
+    error = int(np.abs(colors.astype(np.int32) - entries[index]).max())
+    return palette, index, error
+
+
+class FrameEncoder:
+    """Encode rendered frames as a full RGB frame, a delta or a palette frame.
+
+    A delta is a sequence of ``(offset, length, bytes)`` records covering only
+    the dirty spans since the previous frame. Whichever encoding is smaller is
+    used; the first frame, and the first after ``reset``, is always full so
+    the receiver has a baseline to apply deltas to.
+
+    With ``palette`` enabled a full frame may instead be sent as one index
+    byte per LED into a palette of up to 256 colors, as long as quantizing
+    the frame stays within ``max_error``. The palette and the color-to-index
+    mapping behind it are cached: while later frames only use colors already
+    mapped, they are encoded with one lookup and sent without the palette.
+    """
+
+    def __init__(self, palette=False, max_error=DEFAULT_PALETTE_MAX_ERROR):
+        """Initialize the encoder and its counters."""
+        self.palette = palette
+        self.max_error = max_error
+        self._primed = False
+        self._palette = None
+        self._palette_keys = None
+        self._palette_index = None
+        self._palette_sent = False
+        self.frames = 0
+        self.full_frames = 0
+        self.delta_frames = 0
+        self.palette_frames = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    def reset(self):
+        """Force the next frame to be sent in full, with its palette."""
+        self._primed = False
+        self._palette_sent = False
+
+    @property
+    def stats(self):
+        """Return the encoder counters."""
+        return {
+            "frames": self.frames,
+            "full_frames": self.full_frames,
+            "delta_frames": self.delta_frames,
+            "palette_frames": self.palette_frames,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def encode(self, frame, dirty_spans):
+        """Encode a rendered ``(n, 3)`` uint8 frame.
+
+        Returns ``(encoding, payload)``, or None if nothing changed.
+        """
+        full_size = frame.size
+        best = None
+        if self._primed:
+            spans = merge_spans(dirty_spans, MERGE_GAP)
+            if not spans:
+                return None
+            records = []
+            for start, end in spans:
+                end = min(end, len(frame) - 1)
+                while start <= end:
+                    length = min(end - start + 1, MAX_RECORD_LEDS)
+                    records.append(RECORD_HEADER.pack(start, length))
+                    records.append(frame[start:start + length].tobytes())
+                    start += length
+            delta_size = sum(len(record) for record in records)
+            if delta_size < full_size:
+                best = delta_size, ENCODING_DELTA, records
+
+        if self.palette and len(frame) + PALETTE_HEADER.size < (best[0] if best else full_size):
+            payload = self._encode_palette(frame)
+            if payload is not None and len(payload) < (best[0] if best else full_size):
+                self._primed = True
+                self._palette_sent = True
+                self._count(len(payload), full_size)
+                self.palette_frames += 1
+                return ENCODING_PALETTE, payload
+
+        if best is not None:
+            delta_size, _, records = best
+            self._count(delta_size, full_size)
+            self.delta_frames += 1
+            return ENCODING_DELTA, b"".join(records)
+
+        self._primed = True
+        self._count(full_size, full_size)
+        self.full_frames += 1
+        return ENCODING_RGB, frame.tobytes()
+
+    def _encode_palette(self, frame):
+        """Return the palette frame payload, or None if quantizing loses too much."""
+        keys = color_keys(frame)
+        if self._palette_keys is not None:
+            # Reuse the cached mapping if it covers every color of this frame.
+            position = np.searchsorted(self._palette_keys, keys)
+            position[position == len(self._palette_keys)] = 0
+            if (self._palette_keys[position] == keys).all():
+                indices = self._palette_index[position].astype(np.uint8)
+                if self._palette_sent:
+                    return PALETTE_HEADER.pack(0) + indices.tobytes()
+                return PALETTE_HEADER.pack(len(self._palette)) + self._palette.tobytes() + indices.tobytes()
+
+        distinct, inverse = np.unique(keys, return_inverse=True)
+        colors = np.stack([distinct >> 16, (distinct >> 8) & 0xFF, distinct & 0xFF], axis=1).astype(np.uint8)
+        palette, index, error = quantize(colors)
+        if error > self.max_error:
+            return None
+        self._palette = palette
+        self._palette_keys = distinct
+        self._palette_index = index
+        self._palette_sent = False
+        indices = index[inverse].astype(np.uint8)
+        return PALETTE_HEADER.pack(len(palette)) + palette.tobytes() + indices.tobytes()
+
+    def _count(self, size, full_size):
+        self.frames += 1
+        self.bytes_sent += size
+        self.bytes_saved += full_size - size
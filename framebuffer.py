@@ -0,0 +1,206 @@
+import numpy as np
+
+from .frame import merge_spans
+
+DEFAULT_RGB = (255, 255, 255)
+
+# Collapse the dirty span list once it grows past this many entries.
+MAX_DIRTY_SPANS = 1024
+
+
+class Framebuffer:
+    """Local mirror of the whole LED chain.
+
+    Holds one RGB triple, one brightness value (0-255) and one on flag per LED
+    address. Entity state is read from views over an entity's
+    ``[start_addr, end_addr]`` slice, and commands become slice assignments,
+    so the cost of a write does not depend on how many entities it touches.
+    Every write also records the span it touched, so frame senders can ship
+    only what changed since they last called ``take_dirty``.
+
+    A separate per-LED shade (0-255) is multiplied into the rendered frame
+    only. Overlays such as the daylight terminator write it, so they dim the
+    output without changing the state of any light. Likewise an overlay color
+    with its own opacity (used by the heatmap) is blended over the result.
+    """
+
+    def __init__(self, num_leds=0):
+        """Initialize a dark framebuffer of ``num_leds`` LEDs."""
+        self.colors = np.zeros((num_leds, 3), dtype=np.uint8)
+        self.brightness = np.zeros(num_leds, dtype=np.uint8)
+        self.on = np.zeros(num_leds, dtype=bool)
+        self.shade = np.full(num_leds, 255, dtype=np.uint8)
+        self.overlay = np.zeros((num_leds, 3), dtype=np.uint8)
+        self.overlay_alpha = np.zeros(num_leds, dtype=np.uint8)
+        self._dirty = [(0, num_leds - 1)] if num_leds else []
+
+    def __len__(self):
+        return len(self.on)
+
+    def resize(self, num_leds):
+        """Grow the framebuffer to hold at least ``num_leds`` LEDs."""
+        extra = num_leds - len(self)
+        if extra <= 0:
+            return
+        self.colors = np.concatenate([self.colors, np.zeros((extra, 3), dtype=np.uint8)])
+        self.brightness = np.concatenate([self.brightness, np.zeros(extra, dtype=np.uint8)])
+        self.on = np.concatenate([self.on, np.zeros(extra, dtype=bool)])
+        self.shade = np.concatenate([self.shade, np.full(extra, 255, dtype=np.uint8)])
+        self.overlay = np.concatenate([self.overlay, np.zeros((extra, 3), dtype=np.uint8)])
+        self.overlay_alpha = np.concatenate([self.overlay_alpha, np.zeros(extra, dtype=np.uint8)])
+        self.mark_dirty(num_leds - extra, num_leds - 1)
+
+    @property
+    def has_overlay(self):
+        """Return True if any LED is currently shaded or overlaid."""
+        return bool(self.overlay_alpha.any()) or bool((self.shade != 255).any())
+
+    def mark_dirty(self, start, end):
+        """Record that LEDs ``start..end`` changed."""
+        self._dirty.append((start, end))
+        if len(self._dirty) > MAX_DIRTY_SPANS:
+            self._dirty = merge_spans(self._dirty)
+
+    def mark_dirty_indices(self, indices):
+        """Record that the LEDs at the given sorted addresses changed."""
+        if not len(indices):
+            return
+        breaks = np.flatnonzero(np.diff(indices) != 1)
+        starts = np.concatenate([indices[:1], indices[breaks + 1]])
+        ends = np.concatenate([indices[breaks], indices[-1:]])
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self.mark_dirty(start, end)
+
+    def take_dirty(self):
+        """Return the merged spans changed since the last call and clear them."""
+        dirty = merge_spans(self._dirty)
+        self._dirty = []
+        return dirty
+
+    def set_range(self, start, end, rgb=None, brightness=None, is_on=None):
+        """Assign color, brightness and/or on state to LEDs ``start..end``."""
+        self.resize(end + 1)
+        window = slice(start, end + 1)
+        if rgb is not None:
+            self.colors[window] = rgb
+        if brightness is not None:
+            self.brightness[window] = brightness
+        if is_on is not None:
+            self.on[window] = is_on
+        self.mark_dirty(start, end)
+
+    def set_indices(self, indices, rgb=None, brightness=None, is_on=None):
+        """Assign color, brightness and/or on state to the LEDs at sorted ``indices``."""
+        if not len(indices):
+            return
+        self.resize(int(indices[-1]) + 1)
+        if rgb is not None:
+            self.colors[indices] = rgb
+        if brightness is not None:
+            self.brightness[indices] = brightness
+        if is_on is not None:
+            self.on[indices] = is_on
+        self.mark_dirty_indices(indices)
+
+    def set_shade(self, indices, shade):
+        """Set the shade of the LEDs at ``indices``; returns how many changed."""
+        if not len(indices):
+            return 0
+        self.resize(int(indices.max()) + 1)
+        changed = self.shade[indices] != shade
+        indices = indices[changed]
+        if not len(indices):
+            return 0
+        self.shade[indices] = shade[changed]
+        self.mark_dirty_indices(np.sort(indices))
+        return len(indices)
+
+    def set_overlay(self, indices, rgb, alpha):
+        """Set the overlay color and opacity of the LEDs at ``indices``; returns how many changed."""
+        if not len(indices):
+            return 0
+        self.resize(int(indices.max()) + 1)
+        changed = (self.overlay_alpha[indices] != alpha) | (self.overlay[indices] != rgb).any(axis=1)
+        indices = indices[changed]
+        if not len(indices):
+            return 0
+        self.overlay[indices] = rgb[changed]
+        self.overlay_alpha[indices] = alpha[changed]
+        self.mark_dirty_indices(np.sort(indices))
+        return len(indices)
+
+    def apply_color_data(self, start, end, data):
+        """Apply a ``set_color`` command payload to LEDs ``start..end``.
+
+        The payload uses the backend's 0-100 brightness scale.
+        """
+        rgb = None
+        if "red" in data and "green" in data and "blue" in data:
+            rgb = (data["red"], data["green"], data["blue"])
+        brightness = None
+        if "brightness" in data:
+            brightness = int(data["brightness"] / 100 * 255)
+        self.set_range(start, end, rgb, brightness, data.get("is_on"))
+
+    def load_entities(self, entities, order):
+        """Load the state reported by the backend for the given entities.
+
+        ``entities`` maps ids to entity dicts and ``order`` lists the ids to
+        load parents-first, so that children, which sit inside their
+        parent's range, override it.
+        """
+        for entity_id in order:
+            entity = entities.get(entity_id)
+            if entity is None or "state" not in entity:
+                continue
+            state = entity["state"]
+            self.set_range(
+                entity["start_addr"],
+                entity["end_addr"],
+                state.get("rgb_color", DEFAULT_RGB),
+                state.get("brightness", 0),
+                state.get("is_on", False),
+            )
+
+    def range_state(self, start, end):
+        """Return ``(is_on, rgb_color, brightness)`` derived from LEDs ``start..end``.
+
+        A range is on if any LED in it is on; color and brightness are the
+        mean and maximum over the range.
+        """
+        window = slice(start, end + 1)
+        on = self.on[window]
+        if not len(on):
+            return False, DEFAULT_RGB, 0
+        rgb = self.colors[window].mean(axis=0).round().astype(int)
+        return bool(on.any()), tuple(int(c) for c in rgb), int(self.brightness[window].max())
+
+    def snapshot(self):
+        """Return a copy of every per-LED array that can be passed to ``restore``."""
+        return (self.colors.copy(), self.brightness.copy(), self.on.copy(), self.shade.copy(),
+                self.overlay.copy(), self.overlay_alpha.copy())
+
+    def restore(self, snapshot):
+        """Restore a state previously returned by ``snapshot`` and mark it all dirty.
+
+        LEDs added since the snapshot was taken stay in the chain, dark.
+        """
+        num_leds = len(self)
+        colors, brightness, on, shade, overlay, overlay_alpha = snapshot
+        self.colors = colors.copy()
+        self.brightness = brightness.copy()
+        self.on = on.copy()
+        self.shade = shade.copy()
+        self.overlay = overlay.copy()
+        self.overlay_alpha = overlay_alpha.copy()
+        self.resize(num_leds)
+        self._dirty = [(0, len(self) - 1)] if len(self) else []
+
+    def render(self):
+        """Return the RGB frame actually shown on the LEDs, as uint8 ``(n, 3)``."""
+        scale = self.brightness.astype(np.uint32) * self.shade * self.on
+        frame = self.colors.astype(np.uint32) * scale[:, None] // (255 * 255)
+        if self.overlay_alpha.any():
+            alpha = self.overlay_alpha.astype(np.uint32)[:, None]
+            frame = (frame * (255 - alpha) + self.overlay * alpha) // 255
+        return frame.astype(np.uint8)
@@ -0,0 +1,159 @@
+import json
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_CELL_SIZE = 5.0  # degrees
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class GeoIndex:
+    """Grid index from latitude/longitude to LED addresses.
+
+    The calibration table gives each LED address a position on the map. The
+    positions are held in flat arrays sorted by grid cell, with an offset
+    array marking where each cell starts, so a query only gathers the rows of
+    cells its area touches and then filters those candidates exactly in one
+    vectorized pass.
+    """
+
+    def __init__(self, addrs, lat, lon, cell_size=DEFAULT_CELL_SIZE):
+        """Build the index from parallel arrays of addresses and coordinates."""
+        self.cell_size = cell_size
+        self.rows = math.ceil(180 / cell_size)
+        self.cols = math.ceil(360 / cell_size)
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = (np.asarray(lon, dtype=np.float64) + 180) % 360 - 180
+        cells = self._row(lat) * self.cols + self._col(lon)
+        order = np.argsort(cells, kind="stable")
+        self.addrs = np.asarray(addrs, dtype=np.int64)[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self._cell_starts = np.searchsorted(cells[order], np.arange(self.rows * self.cols + 1))
+
+    def __len__(self):
+        return len(self.addrs)
+
+    @classmethod
+    def load(cls, path, cell_size=DEFAULT_CELL_SIZE):
+        """Load a calibration table of ``addr, lat, lon`` rows.
+
+        ``.json`` files hold a list of ``[addr, lat, lon]`` triples; anything
+        else is read as CSV with an optional header line.
+        """
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as file:
+                table = np.asarray(json.load(file), dtype=np.float64).reshape(-1, 3)
+        else:
+            with open(path, encoding="utf-8") as file:
+                first = file.readline()
+                skip = 0 if first[:1].lstrip("-").isdigit() else 1
+            table = np.loadtxt(path, delimiter=",", skiprows=skip, ndmin=2)
+        return cls(table[:, 0].astype(np.int64), table[:, 1], table[:, 2], cell_size)
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.cell_size).astype(np.int64), 0, self.rows - 1)
+
+    def _col(self, lon):
+        return np.clip(((np.asarray(lon) + 180) // self.cell_size).astype(np.int64), 0, self.cols - 1)
+
+    def _lon_spans(self, west, east):
+        """Return the column spans covering longitudes ``west..east``, wrapping at 180."""
+        if east - west >= 360:
+            return [(0, self.cols - 1)]
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+        if west <= east:
+            return [(int(self._col(west)), int(self._col(east)))]
+        return [(int(self._col(west)), self.cols - 1), (0, int(self._col(east)))]
+
+    def _candidates(self, south, north, lon_spans):
+        """Return the positions of the LEDs in the cells touching the area."""
+        starts = self._cell_starts
+        chunks = []
+        for row in range(int(self._row(south)), int(self._row(north)) + 1):
+            base = row * self.cols
+            for first, last in lon_spans:
+                lo, hi = starts[base + first], starts[base + last + 1]
+                if hi > lo:
+                    chunks.append(np.arange(lo, hi))
+        if not chunks:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def nearest(self, lat, lon, chunk=1024):
+        """Return the position (index into ``addrs``) of the LED nearest each point.
+
+        Compares unit vectors on the sphere in chunks of ``chunk`` points to
+        bound memory; meant for building lookup tables, not per-event use.
+        """
+        leds = _unit_vectors(self.lat, self.lon).astype(np.float32)
+        points = _unit_vectors(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+        result = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), chunk):
+            block = points[start:start + chunk].astype(np.float32)
+            result[start:start + chunk] = (block @ leds.T).argmax(axis=1)
+        return result
+
+    def _result(self, positions):
+        return np.unique(self.addrs[positions])
+
+    def radius(self, lat, lon, radius_km):
+        """Return the sorted addresses within ``radius_km`` of a point."""
+        dlat = radius_km / KM_PER_DEGREE
+        south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        widest = math.cos(math.radians(max(abs(south), abs(north))))
+        if south <= -90 or north >= 90 or widest * 180 <= dlat:
+            spans = [(0, self.cols - 1)]
+        else:
+            dlon = dlat / widest
+            spans = self._lon_spans(lon - dlon, lon + dlon)
+        positions = self._candidates(south, north, spans)
+
+        # Haversine distance to every candidate.
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        lat2, lon2 = np.radians(self.lat[positions]), np.radians(self.lon[positions])
+        a = (np.sin((lat2 - lat1) / 2) ** 2
+             + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+        return self._result(positions[distance <= radius_km])
+
+    def bbox(self, south, west, north, east):
+        """Return the sorted addresses inside a bounding box.
+
+        A box with ``west > east`` crosses the antimeridian.
+        """
+        positions = self._candidates(south, north, self._lon_spans(west, east))
+        lat, lon = self.lat[positions], self.lon[positions]
+        inside = (lat >= south) & (lat <= north)
+        if west <= east:
+            inside &= (lon >= west) & (lon <= east)
+        else:
+            inside &= (lon >= west) | (lon <= east)
+        return self._result(positions[inside])
+
+    def polygon(self, points):
+        """Return the sorted addresses inside a polygon of ``(lat, lon)`` vertices.
+
+        Uses the even-odd rule; the polygon must not cross the antimeridian.
+        """
+        vertices = np.asarray(points, dtype=np.float64)
+        south, west = vertices.min(axis=0)
+        north, east = vertices.max(axis=0)
+        positions = self._candidates(south, north, self._lon_spans(west, east))
+        lat, lon = self.lat[positions], self.lon[positions]
+
+        inside = np.zeros(len(positions), dtype=bool)
+        for (lat1, lon1), (lat2, lon2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+            if lat1 == lat2:
+                continue
+            crosses = (lat1 > lat) != (lat2 > lat)
+            lon_at = lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1)
+            inside ^= crosses & (lon < lon_at)
+        return self._result(positions[inside])
@@ -0,0 +1,148 @@
+from collections import deque
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_HEALTHY = "healthy"
+STATE_DEGRADED = "degraded"
+STATE_OPEN = "open"
+
+WINDOW_SIZE = 20
+MIN_SAMPLES = 5
+DEGRADED_ERROR_RATE = 0.1
+OPEN_ERROR_RATE = 0.5
+OPEN_CONSECUTIVE_FAILURES = 3
+PROBE_DELAY_MIN = 5
+PROBE_DELAY_MAX = 120
+
+
+class TransportHealth:
+    """Circuit breaker tracking the health of one transport.
+
+    Keeps a moving window of recent outcomes and latencies. The transport is
+    ``healthy``, ``degraded`` once errors or latency creep up, and ``open``
+    once it is clearly failing; an open transport is not used at all and is
+    instead probed in the background with exponential backoff until a probe
+    succeeds. Only state changes are logged.
+    """
+
+    def __init__(self, hass, name, probe=None, slow_latency=1.0):
+        """Initialize the tracker; ``probe`` is an async callable returning success."""
+        self.hass = hass
+        self.name = name
+        self.probe = probe
+        self.slow_latency = slow_latency
+        self.state = STATE_HEALTHY
+        self._outcomes = deque(maxlen=WINDOW_SIZE)
+        self._latencies = deque(maxlen=WINDOW_SIZE)
+        self._consecutive_failures = 0
+        self._probe_delay = PROBE_DELAY_MIN
+        self._probe_handle = None
+        self._recover_callbacks = []
+        self.failures = 0
+
+    @property
+    def error_rate(self):
+        """Return the share of failures in the window."""
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    @property
+    def latency(self):
+        """Return the mean latency of the successes in the window, in seconds."""
+        if not self._latencies:
+            return None
+        return sum(self._latencies) / len(self._latencies)
+
+    @property
+    def stats(self):
+        """Return the tracker state and window statistics."""
+        return {
+            "state": self.state,
+            "error_rate": self.error_rate,
+            "latency": self.latency,
+            "failures": self.failures,
+        }
+
+    def add_recover_callback(self, recover_callback):
+        """Call ``recover_callback()`` whenever the circuit closes again."""
+        self._recover_callbacks.append(recover_callback)
+
+    def allow(self):
+        """Return True if the transport may be used."""
+        return self.state != STATE_OPEN
+
+    def record_success(self, latency):
+        """Record a successful call and its latency in seconds."""
+        self._outcomes.append(True)
+        self._latencies.append(latency)
+        self._consecutive_failures = 0
+        self._evaluate()
+
+    def record_failure(self):
+        """Record a failed call."""
+        self.failures += 1
+        self._outcomes.append(False)
+        self._consecutive_failures += 1
+        self._evaluate()
+
+    def _evaluate(self):
+        if self.state == STATE_OPEN:
+            return
+        error_rate = self.error_rate
+        if self._consecutive_failures >= OPEN_CONSECUTIVE_FAILURES or (
+                len(self._outcomes) >= MIN_SAMPLES and error_rate >= OPEN_ERROR_RATE):
+            self._open()
+            return
+        latency = self.latency
+        degraded = error_rate >= DEGRADED_ERROR_RATE or (latency is not None and latency > self.slow_latency)
+        self._set_state(STATE_DEGRADED if degraded else STATE_HEALTHY)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        log = _LOGGER.info if state == STATE_HEALTHY else _LOGGER.warning
+        log(f"{self.name} transport is now {state} (error rate {self.error_rate:.0%})")
+        self.state = state
+
+    def _open(self):
+        self._set_state(STATE_OPEN)
+        self._schedule_probe()
+
+    def _schedule_probe(self):
+        if self.probe is None:
+            # Nothing to probe with; retry with real traffic after the delay.
+            self._probe_handle = self.hass.loop.call_later(self._probe_delay, self._close)
+        else:
+            self._probe_handle = self.hass.loop.call_later(
+                self._probe_delay, lambda: self.hass.async_create_task(self._async_probe()))
+
+    async def _async_probe(self):
+        self._probe_handle = None
+        try:
+            ok = await self.probe()
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.debug(f"{self.name} probe failed: {e}")
+            ok = False
+        if ok:
+            self._close()
+        else:
+            self._probe_delay = min(self._probe_delay * 2, PROBE_DELAY_MAX)
+            self._schedule_probe()
+
+    def _close(self):
+        self._probe_handle = None
+        self._probe_delay = PROBE_DELAY_MIN
+        self._outcomes.clear()
+        self._latencies.clear()
+        self._consecutive_failures = 0
+        self._set_state(STATE_HEALTHY)
+        for recover_callback in self._recover_callbacks:
+            recover_callback()
+
+    def cancel(self):
+        """Cancel any scheduled probe."""
+        if self._probe_handle is not None:
+            self._probe_handle.cancel()
+            self._probe_handle = None
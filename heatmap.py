@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+
+DEFAULT_HALF_LIFE = 30.0  # seconds
+DEFAULT_HEAT_SCALE = 10.0  # heat shown at the top of the colormap
+DEFAULT_COLORMAP = "heat"
+LOOKUP_RESOLUTION = 0.5  # degrees per nearest-LED lookup cell
+
+# Heat below this is dropped to zero so the layer can go idle.
+HEAT_EPSILON = 1e-3
+
+COLORMAPS = {
+    "heat": [(0, 0, 0), (120, 0, 90), (220, 30, 30), (255, 150, 0), (255, 255, 120)],
+    "viridis": [(68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37)],
+    "ice": [(0, 0, 0), (0, 40, 120), (0, 130, 220), (120, 220, 255), (255, 255, 255)],
+}
+
+
+def colormap_lut(name):
+    """Return a ``(256, 3)`` uint8 lookup table interpolated from a colormap's stops."""
+    stops = np.asarray(COLORMAPS[name], dtype=np.float64)
+    x = np.linspace(0, 1, len(stops))
+    levels = np.linspace(0, 1, 256)
+    return np.stack([np.interp(levels, x, stops[:, c]) for c in range(3)], axis=1).round().astype(np.uint8)
+
+
+class HeatmapLayer:
+    """Accumulate streams of geo points as decaying heat on the LEDs.
+
+    Every point is binned to its nearest LED through a lookup table over a
+    fixed lat/lon grid built once from the calibration, then added to one
+    float array holding the heat of every calibrated LED. Memory is fixed no
+    matter how fast points arrive, since points are folded in as they are
+    ingested rather than queued. The frame scheduler steps the layer at its
+    own rate: heat decays exponentially and is drawn through a colormap into
+    the framebuffer overlay, on top of the light colors.
+
+    Building the lookup table is CPU-bound, so it is left to ``build_lookup``
+    (run it in an executor); ``enable`` then registers the layer with the
+    scheduler. Points that arrive before that are dropped.
+    """
+
+    def __init__(self, framebuffer, scheduler, geo_index, half_life=DEFAULT_HALF_LIFE,
+                 scale=DEFAULT_HEAT_SCALE, colormap=DEFAULT_COLORMAP):
+        """Initialize the layer; it stays disabled until ``enable`` is called."""
+        self.framebuffer = framebuffer
+        self.scheduler = scheduler
+        self.geo_index = geo_index
+        self.half_life = half_life
+        self.scale = scale
+        self.lut = colormap_lut(colormap)
+        self.heat = np.zeros(len(geo_index), dtype=np.float32)
+        self._rows = round(180 / LOOKUP_RESOLUTION)
+        self._cols = round(360 / LOOKUP_RESOLUTION)
+        self._lookup = None
+        self._enabled = False
+        self._last_step = None
+        self._visible = False
+        self.points_ingested = 0
+        self.points_dropped = 0
+
+    def build_lookup(self):
+        """Build the nearest-LED table over the lookup grid."""
+        lat = -90 + (np.arange(self._rows) + 0.5) * LOOKUP_RESOLUTION
+        lon = -180 + (np.arange(self._cols) + 0.5) * LOOKUP_RESOLUTION
+        grid_lat, grid_lon = np.meshgrid(lat, lon, indexing="ij")
+        self._lookup = self.geo_index.nearest(grid_lat.ravel(), grid_lon.ravel()).astype(np.int32)
+
+    def enable(self):
+        """Register the layer with the frame scheduler once the lookup table is built."""
+        if self._enabled or self._lookup is None:
+            return
+        self._enabled = True
+        self.scheduler.add_layer(self)
+
+    @property
+    def active(self):
+        """Return True while there is heat to draw or an overlay to clear."""
+        return self._visible or bool(self.heat.any())
+
+    def add_points(self, lat, lon, weight=None):
+        """Add the heat of a batch of points given as parallel arrays."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if not len(lat):
+            return
+        if not self._enabled:
+            self.points_dropped += len(lat)
+            return
+        row = np.clip(((lat + 90) / LOOKUP_RESOLUTION).astype(np.int64), 0, self._rows - 1)
+        col = (((lon + 180) % 360) / LOOKUP_RESOLUTION).astype(np.int64) % self._cols
+        positions = self._lookup[row * self._cols + col]
+        self.heat += np.bincount(positions, weights=weight, minlength=len(self.heat)).astype(np.float32)
+        self.points_ingested += len(lat)
+        self.scheduler.wake()
+
+    def add_rows(self, rows):
+        """Add points given as ``[lat, lon]`` or ``[lat, lon, weight]`` rows.
+
+        The weight defaults to 1, and rows with non-finite values are skipped.
+        Raises ValueError if ``rows`` is not a list of such rows.
+        """
+        try:
+            padded = []
+            for row in rows:
+                if len(row) not in (2, 3):
+                    raise ValueError(f"expected 2 or 3 values, got {len(row)}")
+                padded.append((row[0], row[1], row[2] if len(row) == 3 else 1.0))
+            points = np.array(padded, dtype=np.float64).reshape(-1, 3)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Malformed heat points: {e}") from e
+        points = points[np.isfinite(points).all(axis=1)]
+        self.add_points(points[:, 0], points[:, 1], points[:, 2])
+
+    def clear(self):
+        """Drop all heat; the overlay fades out on the next frame."""
+        self.heat[:] = 0
+        self.scheduler.wake()
+
+    def step(self, now):
+        """Decay the heat to time ``now`` and draw it into the overlay."""
+        if self._last_step is not None:
+            self.heat *= math.pow(0.5, (now - self._last_step) / self.half_life)
+        self._last_step = now
+        self.heat[self.heat < HEAT_EPSILON] = 0
+        level = np.minimum(self.heat / self.scale, 1)
+        codes = np.rint(level * 255).astype(np.uint8)
+        # The heat level doubles as opacity, so cold LEDs show the light below.
+        self.framebuffer.set_overlay(self.geo_index.addrs, self.lut[codes], codes)
+        self._visible = bool(codes.any())
+        if not self.heat.any():
+            self._last_step = None
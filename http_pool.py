@@ -0,0 +1,85 @@
+import aiohttp
+
+# The backend is a single host, so the pool is sized for it rather than for
+# aiohttp's defaults (100 connections, unlimited per host).
+POOL_LIMIT = 16
+KEEPALIVE_TIMEOUT = 30
+DNS_CACHE_TTL = 300
+DEFAULT_REQUEST_TIMEOUT = 10
+CONNECT_TIMEOUT = 5
+
+
+class PoolStats:
+    """Connection pool counters fed by an aiohttp trace config."""
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.queued = 0
+        self.errors = 0
+
+    @property
+    def stats(self):
+        """Return the counters."""
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "queued": self.queued,
+            "errors": self.errors,
+        }
+
+    def trace_config(self):
+        """Return a trace config that updates these counters."""
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_end.append(self._on_request_end)
+        trace_config.on_request_exception.append(self._on_request_exception)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_connection_queued_start.append(self._on_connection_queued_start)
+        return trace_config
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    async def _on_request_end(self, session, context, params):
+        self.in_flight -= 1
+
+    async def _on_request_exception(self, session, context, params):
+        self.in_flight -= 1
+        self.errors += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.connections_reused += 1
+
+    async def _on_connection_queued_start(self, session, context, params):
+        self.queued += 1
+
+
+def create_session(pool_stats, request_timeout=DEFAULT_REQUEST_TIMEOUT):
+    """Create the one HTTP session shared by REST calls and the Socket.IO client.
+
+    Connections to the backend are kept alive and reused, DNS lookups are
+    cached, and every request is bounded by ``request_timeout`` seconds.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    timeout = aiohttp.ClientTimeout(total=request_timeout, connect=CONNECT_TIMEOUT)
+    return aiohttp.ClientSession(
+        connector=connector, timeout=timeout, trace_configs=[pool_stats.trace_config()])
@@ -0,0 +1,184 @@
+from bisect import bisect_left, insort
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AddressIndex:
+    """Interval index over the LED address ranges of the entities.
+
+    Ranges are inclusive ``[start_addr, end_addr]``. Intervals are kept in a
+    list sorted by start address, and an implicit balanced tree over that list
+    stores the largest end address of every subtree, so point and overlap
+    queries run in O(log n + k). Updates are applied incrementally from the
+    coordinator data: only entities whose range or parent changed touch the
+    sorted list, and the subtree maxima are rebuilt lazily on the next query.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self._entities = {}
+        self._intervals = []
+        self._max_end = []
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __contains__(self, entity_id):
+        return entity_id in self._entities
+
+    def get(self, entity_id):
+        """Return the ``(start_addr, end_addr, parent_id)`` of an entity."""
+        return self._entities.get(entity_id)
+
+    def update(self, entities):
+        """Bring the index in line with a list of entity dicts.
+
+        Returns True if anything changed.
+        """
+        seen = set()
+        changed = False
+        for entity in entities:
+            entity_id = entity["id"]
+            seen.add(entity_id)
+            record = (entity["start_addr"], entity["end_addr"], entity.get("parent_id"))
+            current = self._entities.get(entity_id)
+            if current == record:
+                continue
+            if current is not None:
+                self._remove_interval(entity_id, current)
+            self._entities[entity_id] = record
+            insort(self._intervals, (record[0], record[1], entity_id))
+            changed = True
+
+        for entity_id in [entity_id for entity_id in self._entities if entity_id not in seen]:
+            self._remove_interval(entity_id, self._entities.pop(entity_id))
+            changed = True
+
+        if changed:
+            self._dirty = True
+        return changed
+
+    def _remove_interval(self, entity_id, record):
+        item = (record[0], record[1], entity_id)
+        pos = bisect_left(self._intervals, item)
+        del self._intervals[pos]
+
+    def _rebuild(self):
+        intervals = self._intervals
+        max_end = [0] * len(intervals)
+
+        def build(lo, hi):
+            mid = (lo + hi) // 2
+            end = intervals[mid][1]
+            if lo < mid:
+                end = max(end, build(lo, mid))
+            if mid + 1 < hi:
+                end = max(end, build(mid + 1, hi))
+            max_end[mid] = end
+            return end
+
+        if intervals:
+            build(0, len(intervals))
+        self._max_end = max_end
+        self._dirty = False
+
+    def overlapping(self, start, end):
+        """Return the ids of the entities whose range overlaps ``[start, end]``."""
+        if self._dirty:
+            self._rebuild()
+        intervals = self._intervals
+        max_end = self._max_end
+        result = []
+        stack = [(0, len(intervals))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if max_end[mid] < start:
+                continue
+            stack.append((lo, mid))
+            interval = intervals[mid]
+            if interval[0] > end:
+                # Everything to the right starts even later.
+                continue
+            if interval[1] >= start:
+                result.append(interval[2])
+            stack.append((mid + 1, hi))
+        return result
+
+
+class HierarchyIndex:
+    """Euler-tour index over the ``parent_id`` tree of the entities.
+
+    Entities are laid out in depth-first preorder, so the descendants of any
+    entity form one contiguous slice of that order and can be listed in
+    O(subtree) without walking the tree. The tour is only rebuilt when the
+    parent relationships change.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self._parents = {}
+        self._order = []
+        self._span = {}
+
+    def update(self, entities):
+        """Rebuild the tour if the parent relationships changed.
+
+        Returns True if the index was rebuilt.
+        """
+        parents = {entity["id"]: entity.get("parent_id") for entity in entities}
+        if parents == self._parents:
+            return False
+        self._parents = parents
+
+        children = {}
+        roots = []
+        for entity_id, parent_id in parents.items():
+            if parent_id is None or parent_id not in parents:
+                roots.append(entity_id)
+            else:
+                children.setdefault(parent_id, []).append(entity_id)
+
+        order = []
+        span = {}
+
+        def walk(root):
+            stack = [(root, False)]
+            while stack:
+                entity_id, leaving = stack.pop()
+                if leaving:
+                    span[entity_id] = (span[entity_id], len(order))
+                    continue
+                span[entity_id] = len(order)
+                order.append(entity_id)
+                stack.append((entity_id, True))
+                stack.extend(
+                    (child, False) for child in reversed(children.get(entity_id, ())) if child not in span)
+
+        for root in roots:
+            walk(root)
+        # Entities left over sit in a parent_id cycle (or under one), so no
+        # root reaches them. Break each cycle at the first entity found.
+        for entity_id in parents:
+            if entity_id not in span:
+                _LOGGER.warning(f"Entity {entity_id} is in a parent_id cycle, treating it as a root")
+                walk(entity_id)
+        self._order = order
+        self._span = span
+        return True
+
+    def subtrees(self, entity_ids):
+        """Return the union of the subtrees of the given entities, in preorder."""
+        spans = sorted(self._span[entity_id] for entity_id in entity_ids if entity_id in self._span)
+        order = []
+        covered = 0
+        for start, end in spans:
+            start = max(start, covered)
+            if start < end:
+                order.extend(self._order[start:end])
+                covered = end
+        return order
@@ -1,9 +1,11 @@
-from homeassistant.components.light import LightEntity, ATTR_RGB_COLOR, ATTR_BRIGHTNESS
-from homeassistant.components.light import SUPPORT_BRIGHTNESS, SUPPORT_COLOR
+from homeassistant.components.light import LightEntity, ATTR_RGB_COLOR, ATTR_BRIGHTNESS, ATTR_TRANSITION, ATTR_EFFECT
+from homeassistant.components.light import SUPPORT_BRIGHTNESS, SUPPORT_COLOR, SUPPORT_TRANSITION, SUPPORT_EFFECT
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.util.color import color_hs_to_RGB
-from . import DOMAIN
+from . import DOMAIN, async_propagate_color, async_refresh_once
+from .effects import EFFECT_LIST
 import logging
-import aiohttp
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -12,48 +14,109 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     coordinator = hass.data[DOMAIN]['coordinator']
     api_url = hass.data[DOMAIN]['API_URL']
     session = hass.data[DOMAIN]['session']
+    entity_store = hass.data[DOMAIN]['entity_store']
+
+    entities = hass.data[DOMAIN]['entities']
+
+    @callback
+    def async_sync_entities(added, removed):
+        """Add lights for new backend entities and remove deleted ones."""
+        new_entities = [
+            EntityManagerLightEntity(entity_store.get(entity_id), coordinator, api_url, session, entity_store)
+            for entity_id in added
+            if entity_id not in entities
+        ]
+        if new_entities:
+            _LOGGER.info(f"Adding {len(new_entities)} new entities")
+            async_add_entities(new_entities)
+
+        registry = er.async_get(hass)
+        for entity_id in removed:
+            entity = entities.get(entity_id)
+            if entity is None:
+                continue
+            _LOGGER.info(f"Removing entity {entity_id}")
+            if entity.registry_entry is not None:
+                # Removing the registry entry also removes the entity.
+                registry.async_remove(entity.entity_id)
+            else:
+                hass.async_create_task(entity.async_remove(force_remove=True))
+
+    entity_store.async_add_membership_listener(async_sync_entities)
 
     if not coordinator.data:
         _LOGGER.info("No data received for entities. Skipping entity setup.")
         return
 
-    entities = [EntityManagerLightEntity(entity_data, coordinator, api_url, session) for entity_data in coordinator.data]
-    async_add_entities(entities, True)
+    # The coordinator data was fetched during setup, so the new entities do
+    # not need an update of their own before being added.
+    async_add_entities([EntityManagerLightEntity(entity_data, coordinator, api_url, session, entity_store) for entity_data in coordinator.data])
 
 class EntityManagerLightEntity(LightEntity):
     """Representation of an Entity from the external system."""
 
-    def __init__(self, entity_data, coordinator, api_url, session):
+    # State is pushed from the entity store, never polled per entity.
+    _attr_should_poll = False
+
+    def __init__(self, entity_data, coordinator, api_url, session, entity_store):
         """Initialize the entity."""
-        self._entity_data = entity_data
+        self._initial_entity_data = entity_data
         self.coordinator = coordinator
         self.api_url = api_url
         self._attr_unique_id = entity_data["id"]
-        self._attr_name = entity_data["name"]
         self.session = session
+        self.entity_store = entity_store
+
+    @property
+    def _entity_data(self):
+        """Return the latest data for this entity from the shared store."""
+        return self.entity_store.get(self._attr_unique_id) or self._initial_entity_data
+
+    @property
+    def name(self):
+        """Return the name of the light."""
+        return self._entity_data["name"]
+
+    def _range_state(self):
+        framebuffer = self.hass.data[DOMAIN]['framebuffer']
+        return framebuffer.range_state(self._entity_data["start_addr"], self._entity_data["end_addr"])
 
     @property
     def brightness(self):
         """Return the brightness of the light."""
-        return self._entity_data["state"]["brightness"]
-    
+        return self._range_state()[2]
+
     @property
     def rgb_color(self):
         """Return the rgb color of the light."""
-        return self._entity_data["state"].get("rgb_color", (255, 255, 255))
+        return self._range_state()[1]
 
     @property
     def supported_features(self):
         """Flag supported features."""
-        return SUPPORT_BRIGHTNESS | SUPPORT_COLOR
+        return SUPPORT_BRIGHTNESS | SUPPORT_COLOR | SUPPORT_TRANSITION | SUPPORT_EFFECT
     
     @property
     def is_on(self):
         """Return true if the light is on."""
-        return self._entity_data["state"]["is_on"]
+        return self._range_state()[0]
+
+    @property
+    def effect_list(self):
+        """Return the list of supported effects."""
+        return EFFECT_LIST
+
+    @property
+    def effect(self):
+        """Return the effect currently running on the light."""
+        return self.hass.data[DOMAIN]['effects'].effect_at(self._entity_data["start_addr"])
 
     async def async_turn_on(self, **kwargs):
         """Turn on the light."""
+        if kwargs.get(ATTR_EFFECT) in EFFECT_LIST:
+            self._start_effect(kwargs[ATTR_EFFECT], kwargs)
+            return
+
         data = {"entity": self._attr_unique_id, "is_on": True}
 
         # Check if color or brightness is specified in kwargs and update data accordingly
@@ -65,11 +128,17 @@ class EntityManagerLightEntity(LightEntity):
             color_data = self._prepare_color_data(kwargs)
             data.update(color_data)
 
+        if kwargs.get(ATTR_TRANSITION):
+            self._start_transition(data, kwargs[ATTR_TRANSITION])
+            return
         await self._send_color_request(data)
 
     async def async_turn_off(self, **kwargs):
         """Turn off the light."""
         data = {"entity": self._attr_unique_id, "is_on": False}
+        if kwargs.get(ATTR_TRANSITION):
+            self._start_transition(data, kwargs[ATTR_TRANSITION])
+            return
         await self._send_color_request(data)
 
     async def async_set_color(self, **kwargs):
@@ -104,72 +173,73 @@ class EntityManagerLightEntity(LightEntity):
         log.append(f"Green: {rgb_color[1]}")
         log.append(f"Blue: {rgb_color[2]}")
 
-        brightness = kwargs.get(ATTR_BRIGHTNESS, self.brightness or 0)
+        brightness = kwargs.get(ATTR_BRIGHTNESS) or self.brightness or 255
 
         log.append(f"Brightness: {brightness}")
 
-        _LOGGER.error(log)
+        _LOGGER.debug(log)
 
         return {
             "red": rgb_color[0],
             "green": rgb_color[1],
             "blue": rgb_color[2],
-            "brightness": 100 #int(brightness / 255 * 100)
+            "brightness": round(brightness / 255 * 100)
         }
 
-    def _update_entity_data(self, data):
-        """Update the internal state of the entity."""
-        if "is_on" in data:
-            self._entity_data["state"]["is_on"] = data["is_on"]
+    def _start_effect(self, effect, kwargs):
+        """Render an effect over the light's range through the frame path."""
+        rgb = None
+        if 'hs_color' in kwargs:
+            rgb = color_hs_to_RGB(*kwargs['hs_color'])
+        elif ATTR_RGB_COLOR in kwargs:
+            rgb = kwargs[ATTR_RGB_COLOR]
+        self.hass.data[DOMAIN]['transitions'].cancel(self._entity_data["start_addr"], self._entity_data["end_addr"])
+        self.hass.data[DOMAIN]['effects'].start(
+            self.hass.loop.time(),
+            self._entity_data["start_addr"],
+            self._entity_data["end_addr"],
+            effect,
+            rgb,
+        )
+        self.async_write_ha_state()
+
+    def _start_transition(self, data, duration):
+        """Fade to the command's target through frames, then send the command."""
+        rgb = None
         if "red" in data and "green" in data and "blue" in data:
-            self._entity_data["state"]["rgb_color"] = (data["red"], data["green"], data["blue"])
+            rgb = (data["red"], data["green"], data["blue"])
+        brightness = None
         if "brightness" in data:
-            # Scale up brightness to 0-255 range
-            self._entity_data["state"]["brightness"] = int(data["brightness"] / 100 * 255)
+            brightness = int(data["brightness"] / 100 * 255)
+        self.hass.data[DOMAIN]['effects'].stop(self._entity_data["start_addr"], self._entity_data["end_addr"])
+        self.hass.data[DOMAIN]['transitions'].start(
+            self.hass.loop.time(),
+            self._entity_data["start_addr"],
+            self._entity_data["end_addr"],
+            duration,
+            rgb,
+            brightness,
+            data["is_on"],
+            on_done=lambda: self.hass.async_create_task(self._send_color_request(data)),
+        )
 
     async def _send_color_request(self, data):
-        socketio_client = self.hass.data[DOMAIN]['websocket']
-        if socketio_client:
-            try:
-                # Emit the message to the Flask-SocketIO server
-                await socketio_client.emit('set_color', data, namespace='/ws-color')
-                _LOGGER.info(f"Sent color update via WebSocket for entity {self._attr_unique_id}")
-            except Exception as e:
-                _LOGGER.error(f"Error sending message via WebSocket: {e}, falling back to REST API")
-                await self._send_color_request_fallback(data)
+        batcher = self.hass.data[DOMAIN]['batcher']
+        if await batcher.async_send(data):
+            async_propagate_color(self.hass, self._attr_unique_id, data)
         else:
-            _LOGGER.error(f"No WebSocket connection available, falling back to REST API")
-            await self._send_color_request_fallback(data)
-
-    async def _send_color_request_fallback(self, data):
-        try:
-            async with self.session.post(f"{self.api_url}/color/", json=data) as response:
-                if response.status == 200:
-                    response_data = await response.json()
-                    if response_data.get("success"):
-                        self._update_entity_data_from_response(response_data)
-                        _LOGGER.info(f"Updated color for entity {self._attr_unique_id}")
-                    else:
-                        _LOGGER.error(f"API response indicates failure: {response_data}")
-                else:
-                    error_message = await response.text()
-                    _LOGGER.error(f"Failed to set color for entity: {error_message}")
-        except aiohttp.ClientError as e:
-            _LOGGER.error(f"Error communicating with API to set color: {e}")
-
-    def _update_entity_data_from_response(self, data):
-        """Update the internal state of the entity from API response."""
-        self._entity_data["state"]["is_on"] = data.get("is_on", self.is_on)
-        self._entity_data["state"]["rgb_color"] = (data.get("red", 0), data.get("green", 0), data.get("blue", 0))
-        self._entity_data["state"]["brightness"] = int(data.get("brightness", 0) / 100 * 255)
+            _LOGGER.error(f"Failed to set color for entity {self._attr_unique_id}")
 
     async def async_update(self):
         """Update the entity."""
-        await self.coordinator.async_request_refresh()
+        await async_refresh_once(self.hass)
 
     async def async_added_to_hass(self):
         """Handle additional setup when entity is added to Home Assistant."""
         self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
+            self.entity_store.async_add_listener(self._attr_unique_id, self.async_write_ha_state)
         )
+        entities = self.hass.data[DOMAIN]['entities']
+        entities[self._attr_unique_id] = self
+        self.async_on_remove(lambda: entities.pop(self._attr_unique_id, None))
 
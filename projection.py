@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Sampling plans kept, one per image resolution.
+MAX_PLANS = 4
+
+
+class SamplingPlan:
+    """Bilinear sampling of an equirectangular image at every calibrated LED.
+
+    For one image resolution, holds the four source pixel indices and weights
+    of each LED, in address order, so projecting a frame of that size is one
+    gather and one weighted sum.
+    """
+
+    def __init__(self, geo_index, width, height):
+        """Precompute the pixel indices and weights for a ``width`` x ``height`` image."""
+        order = np.argsort(geo_index.addrs, kind="stable")
+        self.addrs = geo_index.addrs[order]
+        lat, lon = geo_index.lat[order], geo_index.lon[order]
+
+        # Pixel centers sit at half-pixel offsets; longitude wraps, latitude clamps.
+        x = (lon + 180) / 360 * width - 0.5
+        y = (90 - lat) / 180 * height - 0.5
+        x0 = np.floor(x)
+        y0 = np.clip(np.floor(y), 0, height - 1)
+        fx = (x - x0)[:, None]
+        fy = np.clip(y - y0, 0, 1)[:, None]
+        x0 = x0.astype(np.int64) % width
+        x1 = (x0 + 1) % width
+        y0 = y0.astype(np.int64)
+        y1 = np.minimum(y0 + 1, height - 1)
+
+        self.indices = np.stack([y0 * width + x0, y0 * width + x1, y1 * width + x0, y1 * width + x1], axis=1)
+        self.weights = np.concatenate(
+            [(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy], axis=1).astype(np.float32)
+
+    def sample(self, pixels):
+        """Return the ``(n, 3)`` uint8 colors of the LEDs for flat ``(h * w, 3)`` pixels."""
+        gathered = pixels[self.indices].astype(np.float32)
+        rgb = np.einsum("nkc,nk->nc", gathered, self.weights)
+        return np.rint(rgb).astype(np.uint8)
+
+
+class ImageProjector:
+    """Paint equirectangular images onto the calibrated LEDs.
+
+    Sampling plans are cached per resolution, so repeated projections of
+    same-sized images (video frames, animation frames) skip straight to
+    sampling. ``project`` decodes and samples; it is CPU-bound and meant to
+    run in an executor, so the plan cache is guarded by a lock.
+    """
+
+    def __init__(self, geo_index):
+        """Initialize the projector for the LEDs of ``geo_index``."""
+        self.geo_index = geo_index
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, width, height):
+        """Return the sampling plan for a resolution, building it if needed."""
+        key = (width, height)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                plan = self._plans[key] = SamplingPlan(self.geo_index, width, height)
+                if len(self._plans) > MAX_PLANS:
+                    self._plans.popitem(last=False)
+            else:
+                self._plans.move_to_end(key)
+            return plan
+
+    def project_pixels(self, pixels):
+        """Sample an ``(h, w, 3)`` pixel array; returns ``(addrs, rgb)`` in address order."""
+        height, width = pixels.shape[:2]
+        plan = self.plan(width, height)
+        return plan.addrs, plan.sample(pixels.reshape(-1, 3))
+
+    def project(self, data):
+        """Decode encoded image bytes and sample them; returns ``(addrs, rgb)``.
+
+        Raises ValueError for images too large to decode safely.
+        """
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                pixels = np.asarray(image.convert("RGB"))
+        except Image.DecompressionBombError as e:
+            raise ValueError(str(e)) from e
+        return self.project_pixels(pixels)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FRAME_RATE = 30
+
+
+class FrameScheduler:
+    """Single timer loop that renders and sends frames at a fixed rate.
+
+    Layers (transitions, effects, ...) register once and expose an ``active``
+    flag and a ``step(now)`` method that writes into the framebuffer. While any
+    layer is active one task steps them all and sends the resulting changes as
+    one frame per tick, however many lights are animating. When rendering or
+    sending a frame overruns its slot, the ticks that were missed are skipped
+    rather than rendered late, so animations stay in time under load.
+    """
+
+    def __init__(self, hass, framebuffer, frame_sender, frame_rate=DEFAULT_FRAME_RATE):
+        """Initialize the scheduler."""
+        self.hass = hass
+        self.framebuffer = framebuffer
+        self.frame_sender = frame_sender
+        self.interval = 1 / frame_rate
+        self._layers = []
+        self._task = None
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.last_render_time = 0.0
+        self.avg_render_time = 0.0
+        self.last_send_time = 0.0
+        self.avg_send_time = 0.0
+
+    @property
+    def stats(self):
+        """Return frame pacing counters; times are in seconds.
+
+        Render times cover stepping the layers only; send times cover encoding
+        and sending the frame.
+        """
+        return {
+            "frames_rendered": self.frames_rendered,
+            "frames_skipped": self.frames_skipped,
+            "last_render_time": self.last_render_time,
+            "avg_render_time": self.avg_render_time,
+            "last_send_time": self.last_send_time,
+            "avg_send_time": self.avg_send_time,
+        }
+
+    def add_layer(self, layer):
+        """Register a layer to be stepped on every tick."""
+        self._layers.append(layer)
+
+    def wake(self):
+        """Start the timer loop if it is not already running."""
+        if self._task is None:
+            self._task = self.hass.async_create_task(self._async_run())
+
+    async def async_stop(self):
+        """Cancel the timer loop."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _async_run(self):
+        loop = self.hass.loop
+        next_tick = loop.time()
+        try:
+            while any(layer.active for layer in self._layers):
+                now = loop.time()
+                for layer in self._layers:
+                    if layer.active:
+                        layer.step(now)
+                rendered = loop.time()
+                await self.frame_sender.async_send_changes(self.framebuffer)
+                self._record_times(rendered - now, loop.time() - rendered)
+
+                next_tick += self.interval
+                behind = loop.time() - next_tick
+                if behind > 0:
+                    missed = int(behind // self.interval) + 1
+                    self.frames_skipped += missed
+                    next_tick += missed * self.interval
+                await asyncio.sleep(max(0, next_tick - loop.time()))
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.error(f"Frame scheduler stopped: {e}")
+        finally:
+            self._task = None
+
+    def _record_times(self, render_time, send_time):
+        self.frames_rendered += 1
+        self.last_render_time = render_time
+        self.last_send_time = send_time
+        # Exponential moving averages over roughly the last 20 frames.
+        weight = min(self.frames_rendered, 20)
+        self.avg_render_time += (render_time - self.avg_render_time) / weight
+        self.avg_send_time += (send_time - self.avg_send_time) / weight
@@ -0,0 +1,160 @@
+import numpy as np
+
+EASING_LINEAR = "linear"
+EASING_EASE_IN = "ease_in"
+EASING_EASE_OUT = "ease_out"
+EASING_EASE_IN_OUT = "ease_in_out"
+
+EASINGS = [EASING_LINEAR, EASING_EASE_IN, EASING_EASE_OUT, EASING_EASE_IN_OUT]
+
+
+def ease(progress, easing_codes):
+    """Apply each LED's easing curve to its linear progress in [0, 1]."""
+    return np.select(
+        [easing_codes == 1, easing_codes == 2, easing_codes == 3],
+        [
+            progress * progress,
+            1 - (1 - progress) ** 2,
+            progress * progress * (3 - 2 * progress),
+        ],
+        progress,
+    )
+
+
+class TransitionEngine:
+    """Interpolate color and brightness for every transitioning LED at once.
+
+    Each LED carries its own start value, target value, start time, duration
+    and easing curve, so overlapping transitions on different entities are
+    stepped together with a handful of array operations per frame. A new
+    transition on an LED that is already fading starts from wherever it is.
+    """
+
+    def __init__(self, framebuffer, scheduler, easing=EASING_EASE_IN_OUT):
+        """Initialize the engine and register it with the frame scheduler."""
+        self.framebuffer = framebuffer
+        self.scheduler = scheduler
+        self.easing = easing
+        self._from = np.zeros((0, 4), dtype=np.float32)
+        self._to = np.zeros((0, 4), dtype=np.float32)
+        self._t0 = np.zeros(0, dtype=np.float64)
+        self._duration = np.zeros(0, dtype=np.float64)
+        self._easing = np.zeros(0, dtype=np.int8)
+        self._final_on = np.zeros(0, dtype=bool)
+        self._final_brightness = np.zeros(0, dtype=np.uint8)
+        self._owner = np.zeros(0, dtype=np.int64)
+        self._active = np.zeros(0, dtype=bool)
+        self._next_owner = 0
+        self._callbacks = []
+        self._alloc(len(framebuffer))
+        scheduler.add_layer(self)
+
+    def _alloc(self, size):
+        extra = size - len(self._active)
+        if extra <= 0:
+            return
+
+        def grow(array):
+            return np.concatenate([array, np.zeros((extra,) + array.shape[1:], dtype=array.dtype)])
+
+        self._from = grow(self._from)
+        self._to = grow(self._to)
+        self._t0 = grow(self._t0)
+        self._duration = grow(self._duration)
+        self._easing = grow(self._easing)
+        self._final_on = grow(self._final_on)
+        self._final_brightness = grow(self._final_brightness)
+        self._owner = grow(self._owner)
+        self._active = grow(self._active)
+
+    @property
+    def active(self):
+        """Return True while any LED is transitioning."""
+        return bool(self._callbacks) or bool(self._active.any())
+
+    def start(self, now, start, end, duration, rgb=None, brightness=None, is_on=True,
+              easing=None, on_done=None):
+        """Start fading LEDs ``start..end`` towards a target state.
+
+        ``brightness`` is on the 0-255 scale; ``None`` keeps each LED's
+        current value. ``easing`` defaults to the engine's curve. ``on_done``
+        is called once the transition finishes, unless every LED in it has
+        been taken over by a newer transition.
+        """
+        framebuffer = self.framebuffer
+        framebuffer.resize(end + 1)
+        self._alloc(len(framebuffer))
+        window = slice(start, end + 1)
+
+        current = np.empty((end + 1 - start, 4), dtype=np.float32)
+        current[:, :3] = framebuffer.colors[window]
+        current[:, 3] = framebuffer.brightness[window] * framebuffer.on[window]
+
+        target = current.copy()
+        if rgb is not None:
+            target[:, :3] = rgb
+        final_brightness = framebuffer.brightness[window] if brightness is None else brightness
+        target[:, 3] = final_brightness if is_on else 0
+
+        self._next_owner += 1
+        self._from[window] = current
+        self._to[window] = target
+        self._t0[window] = now
+        self._duration[window] = max(duration, 1e-6)
+        self._easing[window] = EASINGS.index(easing or self.easing)
+        self._final_on[window] = is_on
+        self._final_brightness[window] = final_brightness
+        self._owner[window] = self._next_owner
+        self._active[window] = True
+
+        # Fading in starts from the current (possibly zero) brightness, so the
+        # LEDs can be switched on right away.
+        framebuffer.on[window] = True
+        framebuffer.brightness[window] = current[:, 3]
+        framebuffer.mark_dirty(start, end)
+
+        if on_done is not None:
+            self._callbacks.append((now + duration, self._next_owner, window, on_done))
+        self.scheduler.wake()
+
+    def cancel(self, start, end):
+        """Stop any transition on LEDs ``start..end`` where it currently is."""
+        window = slice(start, end + 1)
+        self._active[window] = False
+        self._owner[window] = 0
+
+    def cancel_indices(self, indices):
+        """Stop any transition on the LEDs at ``indices`` where it currently is."""
+        indices = indices[indices < len(self._active)]
+        self._active[indices] = False
+        self._owner[indices] = 0
+
+    def step(self, now):
+        """Advance every active transition to time ``now``."""
+        indices = np.flatnonzero(self._active)
+        if len(indices):
+            progress = np.clip((now - self._t0[indices]) / self._duration[indices], 0, 1)
+            eased = ease(progress, self._easing[indices])[:, None]
+            start = self._from[indices]
+            value = start + (self._to[indices] - start) * eased
+
+            framebuffer = self.framebuffer
+            framebuffer.colors[indices] = np.rint(value[:, :3]).astype(np.uint8)
+            framebuffer.brightness[indices] = np.rint(value[:, 3]).astype(np.uint8)
+
+            done = indices[progress >= 1]
+            if len(done):
+                framebuffer.on[done] = self._final_on[done]
+                framebuffer.brightness[done] = self._final_brightness[done]
+                self._active[done] = False
+            framebuffer.mark_dirty_indices(indices)
+
+        if self._callbacks:
+            pending = []
+            for callback in self._callbacks:
+                end_time, owner, window, on_done = callback
+                if end_time > now:
+                    pending.append(callback)
+                elif (self._owner[window] == owner).any():
+                    on_done()
+            self._callbacks = pending
@@ -0,0 +1,530 @@
+import asyncio
+import logging
+
+import aiohttp
+from socketio import exceptions as socketio_exceptions
+
+from .frame import DEFAULT_PALETTE_MAX_ERROR, ENCODING_RGB, FrameEncoder
+from .health import STATE_DEGRADED, STATE_HEALTHY
+
+_LOGGER = logging.getLogger(__name__)
+
+WS_NAMESPACE = '/ws-color'
+
+DEFAULT_MAX_INFLIGHT = 4
+DEFAULT_ACK_TIMEOUT = 2.0
+
+CONNECT_TIMEOUT = 5
+RECONNECT_DELAY_MIN = 1
+RECONNECT_DELAY_MAX = 60
+# How long commands issued during startup wait for the first connection
+# attempt before taking the REST fallback.
+READY_GRACE = 5
+# How long commands are buffered while reconnecting before they are sent
+# over REST instead.
+DEFAULT_OFFLINE_GRACE = 30
+# While the websocket is degraded and REST is healthy, one in this many color
+# batches still goes over the websocket.
+DEGRADED_WEBSOCKET_SHARE = 4
+
+
+class WebSocketConnection:
+    """Supervise the Socket.IO connection to ``/ws-color`` in the background.
+
+    The connection is opened by a background task, websocket transport first,
+    so integration setup never waits on it. If a websocket-only attempt
+    fails, for example behind a proxy that does not pass websockets, the next
+    attempts use the default transports, long-polling upgraded to websocket
+    where possible. ``ready`` is set while the namespace is connected. Once
+    connected, the client's own reconnection logic takes over; if it gives
+    up, or the first attempt fails, the supervisor retries with exponential
+    backoff.
+    """
+
+    def __init__(self, hass, sio, url):
+        """Initialize the connection supervisor."""
+        self.hass = hass
+        self.sio = sio
+        self.url = url
+        self.ready = asyncio.Event()
+        self.settled = False
+        self.has_connected = False
+        self._task = None
+        self._connect_callbacks = []
+
+    @property
+    def reconnecting(self):
+        """Return True while a connection that was up is down."""
+        return self.has_connected and not self.ready.is_set()
+
+    @property
+    def client(self):
+        """Return the Socket.IO client while it is connected, else None."""
+        return self.sio if self.ready.is_set() else None
+
+    def add_connect_callback(self, connect_callback):
+        """Call ``connect_callback()`` every time the namespace (re)connects."""
+        self._connect_callbacks.append(connect_callback)
+
+    def async_set_connected(self):
+        """Mark the namespace connected; called from the client's connect handler."""
+        self.ready.set()
+        self.settled = True
+        self.has_connected = True
+        for connect_callback in self._connect_callbacks:
+            connect_callback()
+
+    def async_set_disconnected(self):
+        """Mark the namespace disconnected; called from the disconnect handler."""
+        self.ready.clear()
+
+    def async_start(self):
+        """Start the background supervisor."""
+        if self._task is None:
+            self._task = self.hass.async_create_task(self._async_supervise())
+
+    async def async_stop(self):
+        """Stop the supervisor and close the connection."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.ready.clear()
+        self.has_connected = False
+        # Disconnect even when not connected: the client may be between
+        # reconnect attempts, and its reconnect task has to be stopped too.
+        # _reconnect_abort and _reconnect_task are private to the client; they
+        # match the python-socketio release vendored in libs/ (5.11.x) and
+        # must be checked when it is upgraded.
+        await self.sio.disconnect()
+        if self.sio._reconnect_abort is not None:
+            self.sio._reconnect_abort.set()
+        reconnect_task = self.sio._reconnect_task
+        if reconnect_task is not None and not reconnect_task.done():
+            try:
+                await asyncio.wait_for(reconnect_task, CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+
+    async def async_wait_ready(self, timeout):
+        """Wait up to ``timeout`` seconds for the connection; return whether it is up."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready.is_set()
+
+    async def _async_supervise(self):
+        delay = RECONNECT_DELAY_MIN
+        transports = ['websocket']
+        while True:
+            try:
+                await self.sio.connect(
+                    self.url, transports=transports, namespaces=[WS_NAMESPACE],
+                    wait_timeout=CONNECT_TIMEOUT)
+            except Exception as e:  # pylint: disable=broad-except
+                if transports is not None:
+                    # Retry right away with the default transports.
+                    _LOGGER.warning(f"Failed to establish WebSocket connection: {e}, retrying with polling")
+                    transports = None
+                    continue
+                self.settled = True
+                _LOGGER.warning(f"Failed to establish WebSocket connection: {e}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+                transports = ['websocket']
+                continue
+            delay = RECONNECT_DELAY_MIN
+            transports = ['websocket']
+            # Returns once the connection is gone and the client has stopped
+            # trying to reconnect on its own.
+            await self.sio.wait()
+
+
+async def async_probe_websocket(connection, timeout):
+    """Check the websocket with an empty, acknowledged ``set_colors`` batch."""
+    websocket = connection.client
+    if websocket is None:
+        return False
+    await websocket.call('set_colors', [], namespace=WS_NAMESPACE, timeout=timeout)
+    return True
+
+
+async def async_probe_rest(session, api_url):
+    """Check the REST API with an empty color batch."""
+    async with session.post(f"{api_url}/color/batch/", json=[]) as response:
+        return response.status == 200
+
+
+class ColorCommandBatcher:
+    """Coalesce color commands issued close together into one batch.
+
+    Commands submitted within the same event-loop tick, or within ``window``
+    seconds of the first pending command, are sent as a single ``set_colors``
+    event on the websocket, or as a single POST to ``/color/batch/`` when the
+    websocket is unavailable.
+
+    Each entity has one pending slot. While a command for an entity is in
+    flight, newer commands for it are merged into that slot (last writer
+    wins) and only the newest is sent once the in-flight one completes, so a
+    dragged slider never builds up a backlog of stale colors.
+
+    Batches are sent with an acknowledgement, and at most ``max_inflight``
+    unacknowledged batches may be outstanding. Once the window is full new
+    commands wait (and conflate) in their slots instead of piling up in the
+    engineio send queue, and the measured round trip bounds throughput.
+
+    While the websocket is reconnecting, commands are accepted into an
+    offline buffer that keeps only the latest desired state per entity. On
+    reconnect the buffer is replayed as one batch; if reconnecting takes
+    longer than ``offline_grace`` seconds it is sent as one REST batch.
+
+    Each batch is routed straight to the transport whose circuit breaker
+    currently allows it, rather than trying the websocket and falling back on
+    every failure. When neither is usable, commands are buffered as if
+    offline and replayed once a circuit closes.
+    """
+
+    def __init__(self, hass, api_url, session, connection, ws_health, rest_health, window=0.0,
+                 max_inflight=DEFAULT_MAX_INFLIGHT, ack_timeout=DEFAULT_ACK_TIMEOUT,
+                 offline_grace=DEFAULT_OFFLINE_GRACE):
+        """Initialize the batcher."""
+        self.hass = hass
+        self.api_url = api_url
+        self.session = session
+        self.connection = connection
+        self.ws_health = ws_health
+        self.rest_health = rest_health
+        self.window = window
+        self.max_inflight = max_inflight
+        self.ack_timeout = ack_timeout
+        self.offline_grace = offline_grace
+        self._pending = {}
+        self._offline = {}
+        self._offline_timer = None
+        self._waiters = {}
+        self._inflight = set()
+        self._batches_inflight = 0
+        self._flush_scheduled = False
+        self._waiting_ready = False
+        self._startup_done = False
+        self._degraded_batches = 0
+        self.commands_conflated = 0
+        self.commands_acked = 0
+        self.ack_timeouts = 0
+        self.last_rtt = None
+        self.avg_rtt = None
+        self.avg_batch_size = None
+        self.commands_buffered = 0
+        connection.add_connect_callback(self._replay_offline)
+        ws_health.add_recover_callback(self._replay_offline)
+        rest_health.add_recover_callback(self._replay_offline)
+
+    @property
+    def stats(self):
+        """Return flow control counters; round trips are in seconds."""
+        throughput = None
+        if self.avg_rtt:
+            # Commands per second with a full window of average-sized batches.
+            throughput = self.max_inflight * self.avg_batch_size / self.avg_rtt
+        return {
+            "batches_inflight": self._batches_inflight,
+            "pending": len(self._pending),
+            "offline": len(self._offline),
+            "commands_buffered": self.commands_buffered,
+            "commands_conflated": self.commands_conflated,
+            "commands_acked": self.commands_acked,
+            "ack_timeouts": self.ack_timeouts,
+            "last_rtt": self.last_rtt,
+            "avg_rtt": self.avg_rtt,
+            "throughput_ceiling": throughput,
+            "websocket": self.ws_health.stats,
+            "rest": self.rest_health.stats,
+        }
+
+    async def async_send(self, data):
+        """Queue a color command and wait until it, or a newer one, has been sent.
+
+        Returns True if the batch was accepted by either transport.
+        """
+        entity = data["entity"]
+        if entity in self._pending:
+            # Later commands for the same entity win, but keep fields the
+            # newer command does not mention (e.g. color on a turn_off).
+            self._pending[entity].update(data)
+            self.commands_conflated += 1
+        else:
+            self._pending[entity] = dict(data)
+
+        future = self.hass.loop.create_future()
+        self._waiters.setdefault(entity, []).append(future)
+        self._schedule_flush()
+        return await future
+
+    def _schedule_flush(self):
+        if self._flush_scheduled:
+            return
+        self._flush_scheduled = True
+        if self.window > 0:
+            self.hass.loop.call_later(self.window, self._start_flush)
+        else:
+            self.hass.loop.call_soon(self._start_flush)
+
+    def _start_flush(self):
+        self._flush_scheduled = False
+        if not self.connection.settled and not self._startup_done:
+            # Still starting up: hold (and conflate) commands until the first
+            # connection attempt finishes instead of sending them over REST.
+            if not self._waiting_ready:
+                self._waiting_ready = True
+                self.hass.async_create_task(self._async_flush_when_ready())
+            return
+        if self.connection.reconnecting or not self._transport_available():
+            self._buffer_pending()
+            return
+        if self._batches_inflight >= self.max_inflight:
+            # Window full; the next acknowledgement reschedules the flush.
+            return
+        # Entities with a command in flight keep their slot until it returns.
+        ready = [entity for entity in self._pending if entity not in self._inflight]
+        if not ready:
+            return
+        commands = [self._pending.pop(entity) for entity in ready]
+        waiters = [future for entity in ready for future in self._waiters.pop(entity, ())]
+        self._inflight.update(ready)
+        self._batches_inflight += 1
+        self.hass.async_create_task(self._async_flush(ready, commands, waiters))
+
+    def _buffer_pending(self):
+        """Move every pending command into the offline buffer and resolve its callers."""
+        for entity, command in self._pending.items():
+            self._offline[entity] = {**self._offline.get(entity, {}), **command}
+            for future in self._waiters.pop(entity, ()):
+                if not future.done():
+                    future.set_result(True)
+        self.commands_buffered += len(self._pending)
+        self._pending = {}
+        self._arm_offline_timer()
+
+    def _buffer_failed(self, entities, commands):
+        """Keep commands that failed to send; newer buffered commands still win."""
+        for entity, command in zip(entities, commands):
+            self._offline[entity] = {**command, **self._offline.get(entity, {})}
+        self.commands_buffered += len(commands)
+        self._arm_offline_timer()
+
+    def _arm_offline_timer(self):
+        if self._offline and self._offline_timer is None:
+            self._offline_timer = self.hass.loop.call_later(self.offline_grace, self._flush_offline)
+
+    def _take_offline(self):
+        if self._offline_timer is not None:
+            self._offline_timer.cancel()
+            self._offline_timer = None
+        offline = self._offline
+        self._offline = {}
+        return offline
+
+    def _replay_offline(self):
+        """Fold the offline buffer into the pending slots and send it as one batch."""
+        offline = self._take_offline()
+        if not offline:
+            return
+        _LOGGER.info(f"Replaying {len(offline)} buffered color commands after reconnect")
+        for entity, command in offline.items():
+            # Commands issued after the buffered one still win.
+            self._pending[entity] = {**command, **self._pending.get(entity, {})}
+        self._schedule_flush()
+
+    def _flush_offline(self):
+        """Send the offline buffer over REST after waiting too long for the websocket."""
+        self._offline_timer = None
+        if not self.rest_health.allow():
+            # Kept until either circuit closes and replays the buffer.
+            return
+        offline = self._take_offline()
+        if offline:
+            _LOGGER.warning(f"Still reconnecting after {self.offline_grace}s, sending {len(offline)} buffered commands via REST API")
+            self.hass.async_create_task(self._async_flush_offline(offline))
+
+    async def _async_flush_offline(self, offline):
+        if not await self._async_send_batch_fallback(list(offline.values())):
+            self._buffer_failed(list(offline), list(offline.values()))
+
+    async def _async_flush_when_ready(self):
+        await self.connection.async_wait_ready(READY_GRACE)
+        self._startup_done = True
+        self._waiting_ready = False
+        self._schedule_flush()
+
+    async def _async_flush(self, entities, commands, waiters):
+        try:
+            success = await self._async_send_batch(commands)
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.error(f"Unexpected error sending color batch: {e}")
+            success = False
+        finally:
+            self._inflight.difference_update(entities)
+            self._batches_inflight -= 1
+            if self._pending:
+                self._schedule_flush()
+        if not success and (self.connection.reconnecting or not self._transport_available()):
+            # Keep the desired state for replay instead of dropping it.
+            self._buffer_failed(entities, commands)
+            success = True
+        for future in waiters:
+            if not future.done():
+                future.set_result(success)
+
+    def _record_rtt(self, rtt, count):
+        self.commands_acked += count
+        self.last_rtt = rtt
+        if self.avg_rtt is None:
+            self.avg_rtt = rtt
+            self.avg_batch_size = count
+        else:
+            self.avg_rtt += (rtt - self.avg_rtt) / 10
+            self.avg_batch_size += (count - self.avg_batch_size) / 10
+
+    def _transport_available(self):
+        return self.rest_health.allow() or (self.connection.client is not None and self.ws_health.allow())
+
+    def _use_websocket(self):
+        if self.connection.client is None or not self.ws_health.allow():
+            return False
+        if self.ws_health.state == STATE_DEGRADED and self.rest_health.state == STATE_HEALTHY:
+            # Prefer REST while the websocket is degraded and REST is not, but
+            # keep sending the websocket a share of the batches so its window
+            # sees successes again and it can recover.
+            self._degraded_batches += 1
+            return self._degraded_batches % DEGRADED_WEBSOCKET_SHARE == 0
+        return True
+
+    async def _async_send_batch(self, commands):
+        if self._use_websocket():
+            try:
+                sent_at = self.hass.loop.time()
+                await self.connection.client.call(
+                    'set_colors', commands, namespace=WS_NAMESPACE, timeout=self.ack_timeout)
+                rtt = self.hass.loop.time() - sent_at
+                self._record_rtt(rtt, len(commands))
+                self.ws_health.record_success(rtt)
+                _LOGGER.debug(f"Sent color batch of {len(commands)} commands via WebSocket")
+                return True
+            except socketio_exceptions.TimeoutError:
+                self.ack_timeouts += 1
+                self.ws_health.record_failure()
+                _LOGGER.debug(f"Color batch not acknowledged within {self.ack_timeout}s")
+            except Exception as e:  # pylint: disable=broad-except
+                self.ws_health.record_failure()
+                _LOGGER.debug(f"Error sending color batch via WebSocket: {e}")
+        if not self.rest_health.allow():
+            return False
+        return await self._async_send_batch_fallback(commands)
+
+    async def _async_send_batch_fallback(self, commands):
+        sent_at = self.hass.loop.time()
+        try:
+            async with self.session.post(f"{self.api_url}/color/batch/", json=commands) as response:
+                if response.status == 200:
+                    response_data = await response.json()
+                    if response_data.get("success"):
+                        self.rest_health.record_success(self.hass.loop.time() - sent_at)
+                        _LOGGER.debug(f"Set color for {len(commands)} entities via REST API")
+                        return True
+                    _LOGGER.error(f"API response indicates failure: {response_data}")
+                else:
+                    error_message = await response.text()
+                    _LOGGER.debug(f"Failed to set color batch: {error_message}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _LOGGER.debug(f"Error communicating with API to set color batch: {e}")
+        self.rest_health.record_failure()
+        return False
+
+
+class FrameSender:
+    """Send raw RGB frames for a window of LED addresses.
+
+    A frame is 3 bytes per LED starting at ``offset``. On the websocket it is
+    emitted as a ``set_frame`` event whose ``data`` field travels as a binary
+    attachment, so no per-LED JSON is built. The REST fallback posts the same
+    bytes to ``/frame/`` as ``application/octet-stream``. ``async_send_changes``
+    sends only the framebuffer spans dirtied since the previous frame, as a
+    delta when that is smaller than a full frame, or as a palette-indexed
+    frame when ``palette`` is enabled and that is smaller still.
+    """
+
+    def __init__(self, hass, api_url, session, connection, ws_health, rest_health,
+                 palette=False, palette_max_error=DEFAULT_PALETTE_MAX_ERROR):
+        """Initialize the frame sender."""
+        self.hass = hass
+        self.api_url = api_url
+        self.session = session
+        self.connection = connection
+        self.ws_health = ws_health
+        self.rest_health = rest_health
+        self.encoder = FrameEncoder(palette, palette_max_error)
+        # A new connection may be a restarted controller without our baseline.
+        connection.add_connect_callback(self.encoder.reset)
+
+    async def async_send_changes(self, framebuffer):
+        """Send whatever changed in the framebuffer since the last frame.
+
+        Returns True if nothing needed sending or the frame was accepted.
+        """
+        encoded = self.encoder.encode(framebuffer.render(), framebuffer.take_dirty())
+        if encoded is None:
+            return True
+        encoding, data = encoded
+        if not await self.async_send_frame(0, data, encoding):
+            # The receiver may now be out of sync, so start over from a full frame.
+            self.encoder.reset()
+            return False
+        return True
+
+    async def async_send_window(self, framebuffer, start=0, end=None):
+        """Render LEDs ``start..end`` of a framebuffer and send them."""
+        if end is None:
+            end = len(framebuffer) - 1
+        frame = framebuffer.render()[start:end + 1]
+        return await self.async_send_frame(start, frame.tobytes())
+
+    async def async_send_frame(self, offset, data, encoding=ENCODING_RGB):
+        """Send an encoded frame; RGB frames start at LED ``offset``.
+
+        Returns True if the frame was accepted by either transport.
+        """
+        websocket = self.connection.client
+        if websocket and self.ws_health.allow():
+            try:
+                sent_at = self.hass.loop.time()
+                await websocket.emit(
+                    'set_frame', {"encoding": encoding, "offset": offset, "data": data},
+                    namespace=WS_NAMESPACE)
+                self.ws_health.record_success(self.hass.loop.time() - sent_at)
+                _LOGGER.debug(f"Sent {len(data)} byte {encoding} frame at offset {offset} via WebSocket")
+                return True
+            except Exception as e:  # pylint: disable=broad-except
+                self.ws_health.record_failure()
+                _LOGGER.debug(f"Error sending frame via WebSocket: {e}")
+        if not self.rest_health.allow():
+            return False
+        return await self._async_send_frame_fallback(offset, data, encoding)
+
+    async def _async_send_frame_fallback(self, offset, data, encoding):
+        sent_at = self.hass.loop.time()
+        try:
+            async with self.session.post(
+                f"{self.api_url}/frame/",
+                params={"encoding": encoding, "offset": offset},
+                data=data,
+                headers={"Content-Type": "application/octet-stream"},
+            ) as response:
+                if response.status == 200:
+                    self.rest_health.record_success(self.hass.loop.time() - sent_at)
+                    return True
+                error_message = await response.text()
+                _LOGGER.debug(f"Failed to send frame: {error_message}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _LOGGER.debug(f"Error communicating with API to send frame: {e}")
+        self.rest_health.record_failure()
+        return False